@@ -0,0 +1,312 @@
+"""Banco de pruebas sin conexión para medir el rendimiento de la descarga.
+
+Genera CSV sintéticos con la forma de los del portal (separador ';',
+encoding latin-1), levanta servidores HTTP locales que sirven PDF
+sintéticos con latencia, ancho de banda, errores, respuestas 429,
+respuestas a goteo y servidores lentos configurables, y ejecuta de punta a punta el mismo
+plan/ejecución que usa `script.py run`.
+
+Al final imprime y guarda (opcional) una línea base en JSON con archivos/s,
+MB/s, RSS máximo y latencia p95, que se puede comparar entre versiones:
+
+    python benchmark.py --filas 2000 --salida base.json
+    python benchmark.py --filas 2000 --comparar base.json
+
+Requiere las mismas dependencias que script.py (pandas, requests).
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import script
+
+# Instituciones y tipos de documento de ejemplo (con tildes para ejercitar latin-1)
+INSTITUCIONES = ['Municipalidad de Ñuñoa', 'Municipalidad de Concepción', 'Servicio de Salud Araucanía',
+                 'Gobierno Regional de Valparaíso', 'Ministerio de Educación']
+TIPOS = ['Decreto', 'Resolución', 'Contrato', 'Convenio', 'Certificado']
+
+# --- Servidor HTTP sintético ---
+def _tamano_archivo(doc_id, params):
+    """Tamaño determinista del PDF `doc_id` (igual para HEAD y GET)."""
+    rnd = random.Random(doc_id)
+    if rnd.random() < params['fraccion_grandes']:
+        return int(params['tamano_grande_mb'] * 1024 * 1024)
+    return rnd.randint(params['tamano_min_kb'], params['tamano_max_kb']) * 1024
+
+def _servir(host_idx, params, puertos):
+    """Proceso servidor: atiende /doc/<id>/<nombre>.pdf con las condiciones de `params`."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lento = host_idx < params['hosts_lentos']
+    rnd = random.Random(params['semilla'] + host_idx)
+
+    class _Manejador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _responder(self, con_cuerpo):
+            try:
+                doc_id = int(self.path.split('?', 1)[0].strip('/').split('/')[1])
+            except (IndexError, ValueError):
+                self.send_error(404)
+                return
+            latencia = params['latencia_ms'] / 1000 * (params['factor_lento'] if lento else 1)
+            time.sleep(latencia * rnd.uniform(0.5, 1.5))
+            azar = rnd.random()
+            if azar < params['tasa_429']:
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if azar < params['tasa_429'] + params['tasa_error']:
+                self.send_response(500)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            goteo = azar < params['tasa_429'] + params['tasa_error'] + params['tasa_goteo']
+            tamano = _tamano_archivo(doc_id, params)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(tamano))
+            self.end_headers()
+            if not con_cuerpo:
+                return
+            if goteo:
+                # Un byte cada `goteo_ms`: solo el plazo total corta esta descarga
+                try:
+                    for _ in range(tamano):
+                        self.wfile.write(b'0')
+                        self.wfile.flush()
+                        time.sleep(params['goteo_ms'] / 1000)
+                except OSError:
+                    pass
+                return
+            # Enviar por bloques respetando el ancho de banda por conexión
+            bloque = b'%PDF-1.4\n' + b'0' * (64 * 1024 - 9)
+            bytes_seg = params['ancho_banda_kbps'] * 1024 if params['ancho_banda_kbps'] else 0
+            enviados = 0
+            while enviados < tamano:
+                parte = bloque[:min(len(bloque), tamano - enviados)]
+                self.wfile.write(parte)
+                enviados += len(parte)
+                if bytes_seg:
+                    time.sleep(len(parte) / bytes_seg)
+
+        def do_GET(self):
+            self._responder(True)
+
+        def do_HEAD(self):
+            self._responder(False)
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Manejador)
+    servidor.daemon_threads = True
+    puertos.put((host_idx, servidor.server_address[1]))
+    servidor.serve_forever()
+
+def iniciar_servidores(params):
+    """Lanza un proceso servidor por host y devuelve (procesos, puertos)."""
+    puertos = multiprocessing.Queue()
+    procesos = []
+    for i in range(params['hosts']):
+        p = multiprocessing.Process(target=_servir, args=(i, params, puertos), daemon=True)
+        p.start()
+        procesos.append(p)
+    asignados = dict(puertos.get(timeout=30) for _ in procesos)
+    return procesos, [asignados[i] for i in range(params['hosts'])]
+
+# --- Datos sintéticos ---
+def generar_csvs(carpeta, puertos, params):
+    """Escribe `params['csvs']` CSV con `params['filas']` filas en total.
+
+    Parte de los enlaces vienen como HTML con href y muchos comparten el
+    mismo nombre de archivo (distinto query) para forzar colisiones.
+    """
+    rnd = random.Random(params['semilla'])
+    os.makedirs(carpeta, exist_ok=True)
+    por_csv = max(1, params['filas'] // params['csvs'])
+    doc_id = 0
+    for n in range(params['csvs']):
+        ruta = os.path.join(carpeta, f"transparencia_{n + 1}.csv")
+        with open(ruta, 'w', encoding='latin-1', newline='') as f:
+            f.write('Institución;Tipo;Fecha;Descripción;Enlace\n')
+            for _ in range(por_csv):
+                doc_id += 1
+                puerto = puertos[doc_id % len(puertos)]
+                # Mismo nombre y pocos query distintos: muchas colisiones de "stem"
+                url = f"http://127.0.0.1:{puerto}/doc/{doc_id}/documento.pdf?v={doc_id % 97}"
+                enlace = f"<a href='{url}'>Ver documento</a>" if rnd.random() < 0.3 else url
+                fecha = f"2024-{rnd.randint(1, 12):02d}"
+                f.write(f'"{rnd.choice(INSTITUCIONES)}";"{rnd.choice(TIPOS)}";"{fecha}";"Documento {doc_id}";"{enlace}"\n')
+
+def _config_benchmark(params):
+    """Configuración equivalente a config.txt para la corrida de prueba."""
+    config = script.get_default_config()
+    config.update({
+        'carpeta_descargas': 'descargas',
+        'csv_folder': 'csvs',
+        'col_enlace': 'Enlace',
+        'usar_prefijo_columna': 'true',
+        'columna_prefijo': 'Institución',
+        'Nombre_de_la_carpeta': 'Documentos',
+        'usar_carpeta_combinada': 'true',
+        'columna_carpeta_1': 'Tipo',
+        'columna_carpeta_2': 'Fecha',
+        'descargas_simultaneas': str(params['simultaneas']),
+        'duplicar_peticiones_lentas': 'true' if params['respaldo'] else 'false',
+        'timeout_total': str(params['timeout_total']),
+    })
+    return config
+
+# --- Métricas ---
+def rss_maximo_mb():
+    """RSS máximo del proceso en MB, o None si no se puede medir."""
+    try:
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa KB; macOS, bytes
+        return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+    except ImportError:
+        pass
+    if sys.platform != 'win32':
+        return None
+    # Windows: PeakWorkingSetSize vía GetProcessMemoryInfo (sin psutil)
+    import ctypes
+    from ctypes import wintypes
+
+    class _Contadores(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+    try:
+        contadores = _Contadores()
+        contadores.cb = ctypes.sizeof(contadores)
+        kernel32, psapi = ctypes.windll.kernel32, ctypes.windll.psapi
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(_Contadores), wintypes.DWORD]
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(contadores), contadores.cb):
+            return None
+        return contadores.PeakWorkingSetSize / (1024 * 1024)
+    except (AttributeError, OSError):
+        return None
+
+def ejecutar_benchmark(params):
+    """Corre el escenario completo y devuelve el diccionario de resultados."""
+    procesos, puertos = iniciar_servidores(params)
+    directorio_original = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory(prefix='bench_ta_') as tmp:
+            os.chdir(tmp)
+            salida_real = sys.stdout
+            try:
+                generar_csvs('csvs', puertos, params)
+                config = _config_benchmark(params)
+                csv_files = glob.glob(os.path.join('csvs', '*.csv'))
+                if not params['verbose']:
+                    sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+                t0 = time.perf_counter()
+                plan = script.planificar(csv_files, config)
+                t1 = time.perf_counter()
+                session = script._crear_sesion(max(10, params['simultaneas']))
+                resumen = script.ejecutar_plan(plan, session, config=config)
+                t2 = time.perf_counter()
+            finally:
+                if sys.stdout is not salida_real:
+                    sys.stdout.close()
+                    sys.stdout = salida_real
+                # Salir del temporal antes de borrarlo (Windows no borra el cwd)
+                os.chdir(directorio_original)
+    finally:
+        for p in procesos:
+            p.terminate()
+
+    segundos = t2 - t1
+    archivos = resumen['total_pdfs'] + resumen['total_txts']
+    mb = resumen['total_bytes_descargados'] / (1024 * 1024)
+    coberturas = resumen.get('coberturas') or {}
+    rss = rss_maximo_mb()
+    return {
+        'archivos_por_seg': round(archivos / segundos, 3) if segundos else 0,
+        'mb_por_seg': round(mb / segundos, 3) if segundos else 0,
+        # None (null en el JSON) si no se pudo medir: `comparar` lo omite
+        'rss_max_mb': round(rss, 1) if rss is not None else None,
+        'latencia_p95_s': round(resumen.get('latencia_p95', 0), 4),
+        'segundos_plan': round(t1 - t0, 3),
+        'segundos_descarga': round(segundos, 3),
+        'pdfs': resumen['total_pdfs'],
+        'txts': resumen['total_txts'],
+        'errores': resumen['errores'],
+        'respaldos_lanzados': coberturas.get('disparos', 0),
+    }
+
+# Métricas donde un valor mayor es mejor (el resto: menor es mejor)
+MAYOR_ES_MEJOR = {'archivos_por_seg', 'mb_por_seg'}
+
+def comparar(base, actual):
+    """Imprime la variación de cada métrica respecto a una línea base."""
+    print(f"\nComparación con la línea base ({base.get('version', '?')}, {base.get('fecha', '?')}):")
+    for clave, valor in actual['resultados'].items():
+        anterior = base.get('resultados', {}).get(clave)
+        if not isinstance(anterior, (int, float)) or not isinstance(valor, (int, float)):
+            continue
+        cambio = ((valor - anterior) / anterior * 100) if anterior else 0.0
+        mejor = (cambio > 0) == (clave in MAYOR_ES_MEJOR) if cambio else None
+        marca = '' if mejor is None else (' (mejor)' if mejor else ' (peor)')
+        print(f"  {clave:<20} {anterior:>12} -> {valor:<12} {cambio:+.1f}%{marca}")
+
+def _argumentos():
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    ap.add_argument('--filas', type=int, default=1000, help='filas en total entre todos los CSV')
+    ap.add_argument('--csvs', type=int, default=4, help='cantidad de CSV a generar')
+    ap.add_argument('--hosts', type=int, default=4, help='servidores HTTP simulados')
+    ap.add_argument('--hosts-lentos', type=int, default=1, help='cuántos de esos servidores son lentos')
+    ap.add_argument('--factor-lento', type=float, default=10.0, help='multiplicador de latencia de los servidores lentos')
+    ap.add_argument('--latencia-ms', type=float, default=20.0, help='latencia base por petición')
+    ap.add_argument('--ancho-banda-kbps', type=float, default=0, help='KB/s por conexión (0 = sin límite)')
+    ap.add_argument('--tasa-error', type=float, default=0.02, help='fracción de respuestas 500')
+    ap.add_argument('--tasa-429', type=float, default=0.01, help='fracción de respuestas 429')
+    ap.add_argument('--tasa-goteo', type=float, default=0.0, help='fracción de respuestas enviadas a goteo')
+    ap.add_argument('--goteo-ms', type=float, default=200.0, help='milisegundos entre bytes de una respuesta a goteo')
+    ap.add_argument('--timeout-total', type=float, default=600.0, help='timeout_total del downloader (segundos)')
+    ap.add_argument('--tamano-min-kb', type=int, default=20)
+    ap.add_argument('--tamano-max-kb', type=int, default=400)
+    ap.add_argument('--fraccion-grandes', type=float, default=0.01, help='fracción de archivos grandes')
+    ap.add_argument('--tamano-grande-mb', type=float, default=20)
+    ap.add_argument('--simultaneas', type=int, default=4, help='descargas_simultaneas del downloader')
+    ap.add_argument('--respaldo', action='store_true', help='activar duplicar_peticiones_lentas')
+    ap.add_argument('--semilla', type=int, default=1234)
+    ap.add_argument('--verbose', action='store_true', help='mostrar la salida normal del downloader')
+    ap.add_argument('--salida', help='guardar los resultados en este JSON')
+    ap.add_argument('--comparar', help='JSON de una corrida anterior para comparar')
+    return ap.parse_args()
+
+def main():
+    args = _argumentos()
+    params = {k: v for k, v in vars(args).items() if k not in ('salida', 'comparar')}
+    resultado = {
+        'version': script.SCRIPT_VERSION,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'parametros': params,
+        'resultados': ejecutar_benchmark(params),
+    }
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            comparar(json.load(f), resultado)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Microbenchmarks de la etapa de planificación (CSV -> rutas destino).
+
+Mide por separado, sin red, cada paso que `planificar` y `ejecutar_plan`
+hacen por fila: `pd.read_csv`, `iterrows`, `_extraer_url`,
+`_safe_folder_name`, `_safe_file_stem`, `_url_to_safe_stem` y
+`obtener_nombre_unico` (con muchas colisiones de nombre), además de
+`planificar` completo. Para cada tamaño de entrada informa tiempo total,
+microsegundos por fila y memoria máxima (tracemalloc, sobre una muestra).
+
+    python benchmark_planificacion.py --filas 10000,100000,1000000 --salida plan_base.json
+    python benchmark_planificacion.py --comparar plan_base.json
+
+Cada paso tiene un presupuesto de tiempo: si se agota, se mide sobre las
+filas procesadas hasta ese momento y se marca como incompleto.
+"""
+import argparse
+import glob
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import benchmark
+import script
+
+# --- Medición ---
+def _medir_bucle(funcion, entradas, presupuesto):
+    """Aplica `funcion` a cada entrada hasta agotar `presupuesto` segundos.
+
+    Devuelve (filas_procesadas, segundos).
+    """
+    n = 0
+    t0 = time.perf_counter()
+    limite = t0 + presupuesto
+    for entrada in entradas:
+        funcion(entrada)
+        n += 1
+        if n % 1000 == 0 and time.perf_counter() > limite:
+            break
+    return n, time.perf_counter() - t0
+
+def _memoria_pico_kb(funcion, entradas, muestra):
+    """Memoria máxima (KB) asignada al aplicar `funcion` a `muestra` entradas."""
+    tracemalloc.start()
+    try:
+        for i, entrada in enumerate(entradas):
+            if i >= muestra:
+                break
+            funcion(entrada)
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+def _resultado(n, segundos, total, memoria_kb):
+    return {
+        'filas': n,
+        'segundos': round(segundos, 4),
+        'us_por_fila': round(segundos / n * 1e6, 3) if n else 0,
+        'memoria_pico_kb': memoria_kb,
+        'completo': n >= total,
+    }
+
+def medir_tamano(filas, args):
+    """Genera `filas` filas de entrada y mide cada paso de la planificación."""
+    import pandas as pd
+
+    params = {'semilla': args.semilla, 'filas': filas, 'csvs': args.csvs}
+    config = benchmark._config_benchmark({'simultaneas': 1, 'respaldo': False, 'timeout_total': 600})
+    resultados = {}
+    with tempfile.TemporaryDirectory(prefix='bench_plan_') as tmp:
+        carpeta_csv = os.path.join(tmp, 'csvs')
+        # Puertos ficticios: aquí no se hace ninguna petición
+        benchmark.generar_csvs(carpeta_csv, [8001, 8002, 8003, 8004], params)
+        csv_files = sorted(glob.glob(os.path.join(carpeta_csv, '*.csv')))
+
+        def _leer(ruta):
+            df = pd.read_csv(ruta, encoding='latin-1', sep=';', quotechar='"')
+            df.columns = df.columns.str.strip()
+            return df
+
+        t0 = time.perf_counter()
+        dfs = [_leer(r) for r in csv_files]
+        segundos = time.perf_counter() - t0
+        resultados['read_csv'] = _resultado(filas, segundos, filas, _memoria_pico_kb(_leer, csv_files[:1], 1))
+
+        # iterrows: el costo de materializar cada fila como Series
+        def _filas():
+            for df in dfs:
+                for _, row in df.iterrows():
+                    yield row
+        n, segundos = _medir_bucle(lambda row: row['Enlace'], _filas(), args.presupuesto)
+        resultados['iterrows'] = _resultado(n, segundos, filas, _memoria_pico_kb(lambda row: row['Enlace'], _filas(), args.muestra_memoria))
+
+        # Entradas en crudo para las funciones por fila
+        enlaces = [v for df in dfs for v in df['Enlace'].astype(str).tolist()]
+        urls = [script._extraer_url(v) for v in enlaces]
+        carpetas = [f"{i}_Documentos" for df in dfs for i in df['Institución'].astype(str).tolist()]
+        stems_crudos = [os.path.splitext(os.path.basename(script.unquote(script.urlparse(u).path)))[0] for u in urls]
+
+        pasos = [
+            ('extraer_url', script._extraer_url, enlaces),
+            ('safe_folder_name', script._safe_folder_name, carpetas),
+            ('safe_file_stem', script._safe_file_stem, stems_crudos),
+            ('url_to_safe_stem', script._url_to_safe_stem, urls),
+        ]
+        for nombre, funcion, entradas in pasos:
+            n, segundos = _medir_bucle(funcion, entradas, args.presupuesto)
+            resultados[nombre] = _resultado(n, segundos, filas, _memoria_pico_kb(funcion, entradas, args.muestra_memoria))
+
+        # obtener_nombre_unico: mismas (carpeta, stem) que produce el plan, con
+        # colisiones resueltas contra un conjunto de rutas ya reservadas
+        plan = script.planificar(csv_files, config)
+        base = os.path.join(tmp, 'descargas')
+        for d in {item['dir'] for item in plan['items']}:
+            os.makedirs(os.path.join(base, *d.split('/')), exist_ok=True)
+        rutas_base = [os.path.join(base, *item['dir'].split('/'), item['stem']) for item in plan['items']]
+
+        def _nombres(reservadas):
+            def _asignar(ruta_base):
+                reservadas.add(script.obtener_nombre_unico(ruta_base, 'pdf', reservadas))
+            return _asignar
+        n, segundos = _medir_bucle(_nombres(set()), rutas_base, args.presupuesto)
+        resultados['obtener_nombre_unico'] = _resultado(n, segundos, filas, _memoria_pico_kb(_nombres(set()), rutas_base, args.muestra_memoria))
+
+        # planificar completo (lectura + filas + nombres de carpeta y stem)
+        t0 = time.perf_counter()
+        script.planificar(csv_files, config)
+        resultados['planificar'] = _resultado(filas, time.perf_counter() - t0, filas, None)
+    return resultados
+
+def _aplanar(resultados):
+    """{'10000': {'read_csv': {...}}} -> {'10000.read_csv.us_por_fila': x, ...}"""
+    plano = {}
+    for filas, pasos in resultados.items():
+        for paso, medidas in pasos.items():
+            for clave in ('us_por_fila', 'memoria_pico_kb'):
+                if isinstance(medidas.get(clave), (int, float)):
+                    plano[f"{filas}.{paso}.{clave}"] = medidas[clave]
+    return plano
+
+def _imprimir_tabla(filas, pasos):
+    print(f"\n{filas} filas")
+    print(f"| {'Paso':<22} | {'Filas':>9} | {'Segundos':>9} | {'us/fila':>9} | {'Mem. KB':>9} |")
+    print(f"|{'-'*24}|{'-'*11}|{'-'*11}|{'-'*11}|{'-'*11}|")
+    for paso, m in pasos.items():
+        nombre = paso if m['completo'] else f"{paso} (parcial)"
+        memoria = '' if m['memoria_pico_kb'] is None else m['memoria_pico_kb']
+        print(f"| {nombre:<22} | {m['filas']:>9} | {m['segundos']:>9} | {m['us_por_fila']:>9} | {memoria:>9} |")
+
+def _argumentos():
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    ap.add_argument('--filas', default='10000,100000,1000000', help='tamaños de entrada separados por coma')
+    ap.add_argument('--csvs', type=int, default=4, help='CSV entre los que se reparten las filas')
+    ap.add_argument('--presupuesto', type=float, default=30.0, help='segundos máximos por paso')
+    ap.add_argument('--muestra-memoria', type=int, default=10000, help='filas medidas con tracemalloc')
+    ap.add_argument('--semilla', type=int, default=1234)
+    ap.add_argument('--salida', help='guardar los resultados en este JSON')
+    ap.add_argument('--comparar', help='JSON de una corrida anterior para comparar')
+    return ap.parse_args()
+
+def main():
+    args = _argumentos()
+    resultados = {}
+    for filas in [int(x) for x in args.filas.split(',') if x.strip()]:
+        resultados[str(filas)] = medir_tamano(filas, args)
+        _imprimir_tabla(filas, resultados[str(filas)])
+    salida = {
+        'version': script.SCRIPT_VERSION,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'parametros': vars(args),
+        'pasos': resultados,
+        'resultados': _aplanar(resultados),
+    }
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(salida, f, ensure_ascii=False, indent=2)
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            benchmark.comparar(json.load(f), salida)
+
+if __name__ == '__main__':
+    main()
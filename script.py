@@ -3,9 +3,21 @@ from tkinter import messagebox
 import subprocess
 import threading
 import os
+import re
+import time
+import hashlib
+import math
+from collections import deque
+from urllib.parse import urlparse, unquote
 
 CONFIG_FILE = 'config.txt'
 SCRIPT_VERSION = 'v2.4.1'
+# Claves que solo se editan en config.txt (la interfaz no las muestra pero las conserva)
+CLAVES_AVANZADAS = ['intervalo_vigilancia', 'descargas_simultaneas', 'umbral_archivo_grande_mb',
+                    'max_descargas_grandes', 'consultar_tamano', 'archivo_tamanos',
+                    'escritores_disco', 'memoria_escritura_mb', 'timeout_conexion',
+                    'timeout_primer_byte', 'timeout_total', 'duplicar_peticiones_lentas',
+                    'verificaciones_simultaneas', 'max_verificaciones_por_servidor', 'archivo_indice']
 
 def get_default_config():
     """Devuelve un diccionario con los valores por defecto de configuración.
@@ -31,6 +43,27 @@ def get_default_config():
         'columna_carpeta_1': '',
         'columna_carpeta_2': '',
         'separador_carpeta_combinada': '_',
+        # Modo vigilancia (segundos entre revisiones de csv_folder)
+        'intervalo_vigilancia': '2',
+        # Rendimiento: descargas en paralelo y orden por tamaño
+        'descargas_simultaneas': '4',
+        'umbral_archivo_grande_mb': '20',
+        'max_descargas_grandes': '1',
+        'consultar_tamano': 'false',
+        'archivo_tamanos': 'tamanos_conocidos.json',
+        # Escritura diferida a disco
+        'escritores_disco': '2',
+        'memoria_escritura_mb': '256',
+        # Plazos (segundos) y peticiones de respaldo para servidores lentos
+        'timeout_conexion': '10',
+        'timeout_primer_byte': '30',
+        'timeout_total': '600',
+        'duplicar_peticiones_lentas': 'false',
+        # Verificación de enlaces (modo 'verificar')
+        'verificaciones_simultaneas': '32',
+        'max_verificaciones_por_servidor': '4',
+        # Índice SQLite de descargas (vacío para desactivarlo)
+        'archivo_indice': 'indice_descargas.sqlite',
     }
 
 def leer_config():
@@ -75,8 +108,9 @@ def guardar_config(config):
                 v = 'true' if v else 'false'
             f.write(f"{k}={v}\n")
 
-def ejecutar_script():
-    """Ejecuta este mismo script en modo 'run' en una nueva ventana de PowerShell.
+def ejecutar_script(modo='run'):
+    """Ejecuta este mismo script en modo `modo` ('run' o 'vigilar') en una nueva
+    ventana de PowerShell.
 
     Esto permite que la descarga se ejecute en una consola separada
     mientras la interfaz se cierra.
@@ -84,7 +118,7 @@ def ejecutar_script():
     # Ejecuta el script en una nueva ventana de consola
     script_path = os.path.abspath(__file__)
     # Si tienes otro script principal, cámbialo aquí
-    comando = f'powershell.exe -NoExit -Command "python \'{script_path}\' run"'
+    comando = f'powershell.exe -NoExit -Command "python \'{script_path}\' {modo}"'
     subprocess.Popen(comando, shell=True)
 
 def iniciar(config_vars):
@@ -122,6 +156,8 @@ def mostrar_interfaz():
         if k in ['usar_prefijo_columna', 'columna_prefijo', 'tipo_prefijo', 'Nombre_de_la_carpeta',
                  'usar_carpeta_combinada', 'columna_carpeta_1', 'columna_carpeta_2', 'separador_carpeta_combinada', 'separador_prefijo']:
             continue
+        if k in CLAVES_AVANZADAS:
+            continue
         if k == 'eliminar_csv_al_final':
             tk.Label(root, text=k).grid(row=row, column=0, sticky='w', padx=5, pady=5)
             var = tk.BooleanVar(value=(v.strip().lower() == 'true'))
@@ -251,7 +287,8 @@ def mostrar_interfaz():
     # --- Autoguardado inmediato al cambiar cualquier campo ---
     def auto_guardar(*_args):
         try:
-            config_dict = {}
+            # Conservar las claves avanzadas que no tienen control en la UI
+            config_dict = {k: config[k] for k in CLAVES_AVANZADAS if k in config}
             for k, var in config_vars.items():
                 if isinstance(var, tk.BooleanVar):
                     config_dict[k] = 'true' if var.get() else 'false'
@@ -280,7 +317,7 @@ def mostrar_interfaz():
     auto_guardar()
     # --- Fin Autoguardado ---
 
-    def on_iniciar():
+    def on_iniciar(modo='run'):
         # Validar campos vacíos
         for k, var in config_vars.items():
             if k in ['eliminar_csv_al_final', 'usar_prefijo_columna', 'usar_carpeta_combinada']:
@@ -299,8 +336,8 @@ def mostrar_interfaz():
             if var.get().strip() == '':
                 messagebox.showerror('Error', f'El campo "{k}" no puede estar vacío.')
                 return
-        # Guardar y cerrar interfaz
-        config_dict = {}
+        # Guardar y cerrar interfaz (conservando las claves avanzadas)
+        config_dict = {k: config[k] for k in CLAVES_AVANZADAS if k in config}
         for k, var in config_vars.items():
             # Guardar todos los campos, incluyendo los booleanos
             if isinstance(var, tk.BooleanVar):
@@ -313,18 +350,23 @@ def mostrar_interfaz():
                 else:
                     config_dict[k] = var.get()
         guardar_config(config_dict)
-        ejecutar_script()
+        ejecutar_script(modo)
         root.destroy()
 
     btn = tk.Button(root, text='INICIAR', command=on_iniciar, bg='green', fg='white', font=('Arial', 12, 'bold'))
     btn.grid(row=row, column=0, columnspan=2, pady=(15, 5))
 
+    # Botón para dejar el proceso vigilando la carpeta de CSV
+    row += 1
+    tk.Button(root, text='Vigilar carpeta de CSV', command=lambda: on_iniciar('vigilar'), bg='#2d6a9f', fg='white').grid(row=row, column=0, columnspan=2, pady=(0, 8))
+
     def on_reset():
         if not messagebox.askyesno('Confirmar', '¿Restablecer la configuración a los valores predeterminados?\nEsto sobrescribirá el archivo config.txt.'):
             return
         defaults = get_default_config()
         # Guardar inmediatamente en disco con defaults
         guardar_config(defaults)
+        config.update(defaults)
         # Recargar valores en la UI
         for k, var in config_vars.items():
             try:
@@ -371,67 +413,155 @@ def mostrar_interfaz():
     root.geometry(f"{req_w}x{req_h}+{x}+{y}")
     root.mainloop()
 
-# Si se ejecuta con argumento 'run', no mostrar la interfaz, solo ejecutar el script real
-def procesar_csvs():
-    r"""Procesa los CSV y descarga los archivos enlazados.
+# --- Utilidades de nombres, tamaños y progreso ---
+# Expresión regular para extraer href
+HREF_PATTERN = re.compile(r"href=['\"](.*?)['\"]", re.IGNORECASE)
 
-     Flujo principal:
-     1) Lee `config.txt` para saber dónde están los CSV y cómo construir la
-         estructura de carpetas destino (prefijo/sufijo y/o carpeta combinada).
-     2) Abre cada CSV (separador ';', encoding latin-1) y por cada fila extrae
-         un enlace (URL directa o HTML con un href).
-     3) Descarga el recurso. Si es exitoso (HTTP 200 con contenido), guarda PDF;
-         en caso contrario, genera un TXT con el enlace.
+def human_size(num_bytes: int) -> str:
+    """Devuelve el tamaño en MB si >= 1MB; si no, en KB (2 decimales)."""
+    try:
+        if num_bytes is None:
+            return "N/A"
+        if num_bytes >= 1024 * 1024:
+            return f"{num_bytes / (1024*1024):.2f} MB"
+        return f"{num_bytes / 1024:.2f} KB"
+    except Exception:
+        return "N/A"
 
-     Robustez añadida:
-     - Se sanea el "stem" del nombre de archivo derivado de la URL para evitar
-        caracteres inválidos en Windows (p.ej. ?, *, :, \, /, ", <, >, |, &).
-     - Se descarta la parte de consulta (query) de la URL para el nombre visible,
-        añadiendo un hash corto del query cuando exista, para diferenciar recursos.
-     - Se manejan nombres reservados (CON, PRN, AUX, NUL, COM1.., LPT1..).
-    - Se garantiza que los separadores vacíos equivalen a un espacio.
-    """
-    import os
-    import re
-    import requests
-    import pandas as pd
-    import urllib3
-    import glob
-    from urllib.parse import urlparse, unquote
-    import hashlib
-    import time
-    from collections import deque
-    # Desactivar advertencias SSL
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+def human_size_summary(num_bytes: int) -> str:
+    """Devuelve un tamaño legible para resumen: GB, MB o KB (2 decimales)."""
+    try:
+        if num_bytes is None:
+            return "N/A"
+        if num_bytes >= 1024 * 1024 * 1024:  # >= 1 GB
+            return f"{num_bytes / (1024*1024*1024):.2f} GB"
+        if num_bytes >= 1024 * 1024:  # >= 1 MB
+            return f"{num_bytes / (1024*1024):.2f} MB"
+        return f"{num_bytes / 1024:.2f} KB"
+    except Exception:
+        return "N/A"
 
-    # Leer configuración desde config.txt (crea defaults si no existe)
-    config = leer_config()
+def _format_seconds(seg: int) -> str:
+    """Formatea segundos a HH:MM:SS o MM:SS si < 1 hora."""
+    try:
+        seg = int(max(0, seg))
+        h, rem = divmod(seg, 3600)
+        m, s = divmod(rem, 60)
+        if h > 0:
+            return f"{h:02d}:{m:02d}:{s:02d}"
+        return f"{m:02d}:{s:02d}"
+    except Exception:
+        return "--:--"
 
-    # Asignar variables desde config
-    carpeta_descargas = config.get("carpeta_descargas", "descargas")
-    csv_folder = config.get("csv_folder", "csvs")
-    col_enlace = config.get("col_enlace")
-    eliminar_csv_al_final = config.get("eliminar_csv_al_final", "false").lower() == "true"
-    usar_prefijo_columna = config.get("usar_prefijo_columna", "false").lower() == "true"
-    columna_prefijo = config.get("columna_prefijo", "")
-    tipo_prefijo = config.get("tipo_prefijo", "prefijo").strip().lower()
-    nombre_carpeta = config.get("Nombre_de_la_carpeta", "")
-    usar_carpeta_combinada = config.get("usar_carpeta_combinada", "false").lower() == "true"
-    columna_carpeta_1 = config.get("columna_carpeta_1", "")
-    columna_carpeta_2 = config.get("columna_carpeta_2", "")
-    separador_carpeta_combinada = config.get("separador_carpeta_combinada", "_")
-    separador_prefijo = config.get("separador_prefijo", "_")
-    # Si algún separador está vacío, usar espacio en blanco por defecto
-    if separador_carpeta_combinada == "":
-        separador_carpeta_combinada = " "
-    if separador_prefijo == "":
-        separador_prefijo = " "
-    # Soportar valor textual desde configuraciones antiguas
-    if str(separador_carpeta_combinada).strip().lower() == 'espacio en blanco':
-        separador_carpeta_combinada = ' '
-    if str(separador_prefijo).strip().lower() == 'espacio en blanco':
-        separador_prefijo = ' '
+def _progress_bar(current: int, total: int, width: int = 30) -> str:
+    """Barra de progreso ASCII.
 
+    Ej: [##########--------------------]
+    """
+    try:
+        if total <= 0:
+            return "[" + ("-" * width) + "]"
+        ratio = min(max(current / total, 0.0), 1.0)
+        filled = int(round(width * ratio))
+        filled = min(filled, width)
+        return "[" + ("#" * filled) + ("-" * (width - filled)) + "]"
+    except Exception:
+        return "[" + ("-" * width) + "]"
+
+def obtener_nombre_unico(ruta_base, extension, reservadas=()):
+    """Dada una ruta base sin extensión y una extensión, devuelve una ruta
+    única que no exista en disco, añadiendo sufijos -2, -3, ... si hace falta.
+
+    `reservadas` son rutas ya asignadas a otras descargas en curso."""
+    contador = 1
+    ruta_final = f"{ruta_base}.{extension}"
+    while ruta_final in reservadas or os.path.exists(ruta_final):
+        contador += 1
+        ruta_final = f"{ruta_base}-{contador}.{extension}"
+    return ruta_final
+
+def _safe_folder_name(name: str) -> str:
+    r"""Devuelve un nombre de carpeta seguro para Windows.
+
+    - Reemplaza caracteres inválidos (< > : " / \ | ? *) por '_'.
+    - Elimina espacios al inicio/fin.
+    - No intenta recortar longitud por ser parte de la ruta, pero al
+      combinarse con otras partes, Windows impone un límite de 260 chars.
+    """
+    # Reemplazar caracteres inválidos en Windows y limpiar espacios extremos
+    invalid = '<>:"/\\|?*'
+    for ch in invalid:
+        name = name.replace(ch, '_')
+    return name.strip()
+
+def _safe_file_stem(name: str) -> str:
+    """Devuelve un nombre de archivo (sin extensión) seguro para Windows.
+
+    - Reemplaza caracteres inválidos por '_'.
+    - Quita caracteres de control y puntos finales.
+    - Evita nombres reservados (CON, PRN, AUX, NUL, COM1.., LPT1..).
+    - Limita la longitud para evitar rutas excesivas.
+    """
+    # Reemplazar caracteres inválidos explícitos
+    invalid = '<>:"/\\|?*'
+    name = ''.join('_' if ch in invalid else ch for ch in name)
+    # Quitar caracteres de control (0-31) y normalizar otros no ASCII visibles
+    name = ''.join(ch if 32 <= ord(ch) < 127 else '_' for ch in name)
+    # Quitar espacios extremos y puntos al final (Windows no permite)
+    name = name.strip().rstrip('.')
+    # Evitar nombres reservados de Windows (case-insensitive)
+    reserved = {"CON","PRN","AUX","NUL"} | {f"COM{i}" for i in range(1,10)} | {f"LPT{i}" for i in range(1,10)}
+    if not name or name.upper() in reserved:
+        name = f"archivo_{int(time.time())}"
+    # Limitar longitud del "stem" para prevenir rutas demasiado largas
+    return name[:150]
+
+def _url_to_safe_stem(url: str) -> str:
+    """Convierte una URL en un "stem" de nombre de archivo seguro.
+
+    - Usa sólo el último segmento de la ruta (sin la extensión).
+    - Descarta el query visible pero añade un hash corto del query (8 hex)
+      para evitar colisiones cuando distintas URLs comparten el mismo path.
+    - Sanea el resultado con `_safe_file_stem`.
+    """
+    try:
+        parsed = urlparse(url)
+        # Último segmento de la ruta (decodificado), sin extensión
+        last_seg = os.path.basename(unquote(parsed.path))
+        stem, _ext = os.path.splitext(last_seg)
+    except Exception:
+        stem = ''
+        parsed = None
+    if not stem:
+        stem = 'archivo'
+    # Si hay query, agregar huella breve para distinguir
+    try:
+        q = (parsed.query if parsed else '') or ''
+        if q:
+            digest = hashlib.sha1(q.encode('utf-8')).hexdigest()[:8]
+            stem = f"{stem}_{digest}"
+    except Exception:
+        pass
+    return _safe_file_stem(stem)
+
+def resolve_col(df, configured_name: str) -> str:
+    """Dada una columna configurada, devolver el nombre real de la columna en df
+    aplicando strip y case-insensitive. Si no se encuentra, retornar ''."""
+    name = (configured_name or '').strip()
+    if not name:
+        return ''
+    if name in df.columns:
+        return name
+    lower_map = {c.lower(): c for c in df.columns}
+    return lower_map.get(name.lower(), '')
+
+# --- Preparación de la ejecución ---
+def _iniciar_registro(config):
+    """Configura el log a archivo y muestra el banner de inicio.
+
+    Se llama una sola vez por proceso (modo 'run' o 'vigilar'), de modo que
+    el modo vigilancia no duplique el "tee" de la salida por cada CSV.
+    """
     # --- Configurar logging a archivo .log en carpeta definida por el usuario ---
     # Se hace un "tee" de stdout y stderr hacia un archivo de log para registrar toda la salida.
     try:
@@ -505,172 +635,80 @@ def procesar_csvs():
         # No permitir que el banner o su impresión corten la ejecución
         pass
 
-    # Crear carpeta de descarga si no existe
-    os.makedirs(carpeta_descargas, exist_ok=True)
-
-    # Expresión regular para extraer href
-    href_pattern = re.compile(r"href=['\"](.*?)['\"]", re.IGNORECASE)
-
-    # Obtener lista de archivos CSV desde la carpeta configurada
-    csv_files = glob.glob(os.path.join(csv_folder, "*.csv"))
+def _crear_sesion(pool_size=10):
+    """Crea una sesión HTTP reutilizable con pool de conexiones (keep-alive).
 
-    # --- Utilidades ---
-    def human_size(num_bytes: int) -> str:
-        """Devuelve el tamaño en MB si >= 1MB; si no, en KB (2 decimales)."""
-        try:
-            if num_bytes is None:
-                return "N/A"
-            if num_bytes >= 1024 * 1024:
-                return f"{num_bytes / (1024*1024):.2f} MB"
-            return f"{num_bytes / 1024:.2f} KB"
-        except Exception:
-            return "N/A"
-
-    def human_size_summary(num_bytes: int) -> str:
-        """Devuelve un tamaño legible para resumen: GB, MB o KB (2 decimales)."""
-        try:
-            if num_bytes is None:
-                return "N/A"
-            if num_bytes >= 1024 * 1024 * 1024:  # >= 1 GB
-                return f"{num_bytes / (1024*1024*1024):.2f} GB"
-            if num_bytes >= 1024 * 1024:  # >= 1 MB
-                return f"{num_bytes / (1024*1024):.2f} MB"
-            return f"{num_bytes / 1024:.2f} KB"
-        except Exception:
-            return "N/A"
-
-    def _format_seconds(seg: int) -> str:
-        """Formatea segundos a HH:MM:SS o MM:SS si < 1 hora."""
-        try:
-            seg = int(max(0, seg))
-            h, rem = divmod(seg, 3600)
-            m, s = divmod(rem, 60)
-            if h > 0:
-                return f"{h:02d}:{m:02d}:{s:02d}"
-            return f"{m:02d}:{s:02d}"
-        except Exception:
-            return "--:--"
-
-    def _progress_bar(current: int, total: int, width: int = 30) -> str:
-        """Barra de progreso ASCII.
-
-        Ej: [##########--------------------]
-        """
+    Reutilizar la misma sesión entre descargas (y entre CSV en modo
+    vigilancia) evita repetir el handshake TCP/TLS contra cada servidor.
+    """
+    import requests
+    import urllib3
+    from requests.adapters import HTTPAdapter
+    # Desactivar advertencias SSL
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    session = requests.Session()
+    session.verify = False
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _eliminar_csvs(csv_files):
+    """Elimina los CSV indicados, informando cada resultado por consola."""
+    for csv_file in csv_files:
         try:
-            if total <= 0:
-                return "[" + ("-" * width) + "]"
-            ratio = min(max(current / total, 0.0), 1.0)
-            filled = int(round(width * ratio))
-            filled = min(filled, width)
-            return "[" + ("#" * filled) + ("-" * (width - filled)) + "]"
-        except Exception:
-            return "[" + ("-" * width) + "]"
+            os.remove(csv_file)
+            print(f"Eliminado CSV: {csv_file}")
+        except Exception as e:
+            print(f"Error al eliminar {csv_file}: {e}")
+
+# --- Plan de descargas ---
+# Versión del formato del archivo de plan (JSON Lines: cabecera + una línea por descarga)
+PLAN_FORMATO = 1
+
+def planificar(csv_files, config):
+    """Convierte los CSV y la configuración en un plan de descargas.
+
+    No accede a la red ni crea carpetas: solo lee los CSV, extrae la URL de
+    cada fila y calcula la carpeta destino (relativa a `carpeta_descargas`)
+    y el "stem" del archivo. El nombre final (-2, -3, ...) se asigna al
+    ejecutar, porque depende de lo que ya exista en disco.
+
+    Devuelve un diccionario con:
+    - 'carpeta_descargas': carpeta base configurada.
+    - 'filas': total de filas leídas.
+    - 'errores': filas sin URL o CSV sin la columna de enlace.
+    - 'items': lista de {'url', 'dir', 'stem', 'csv', 'fila', 'prefijo',
+      'carpeta_1', 'carpeta_2'}; 'dir' usa '/' como separador, 'fila' es el
+      número de fila de datos (desde 1) y los tres últimos son los valores de
+      las columnas que definen la carpeta ('' si la opción no está activa).
+    """
+    import pandas as pd
 
-    # --- Análisis inicial: contar descargas a intentar ---
-    total_intentos = 0
-    try:
-        for _csv in csv_files:
-            try:
-                _df = pd.read_csv(_csv, encoding='latin-1', sep=';', quotechar='"')
-                try:
-                    _df.columns = _df.columns.str.strip()
-                except Exception:
-                    pass
-                _col_enlace_key = (col_enlace or '').strip()
-                if _col_enlace_key in _df.columns:
-                    _col_enlace_resolved = _col_enlace_key
-                else:
-                    _lower_map = {c.lower(): c for c in _df.columns}
-                    _col_enlace_resolved = _lower_map.get(_col_enlace_key.lower(), '')
-                if not _col_enlace_resolved:
-                    continue
-                for __, _row in _df.iterrows():
-                    _val = str(_row.get(_col_enlace_resolved, ''))
-                    if _val.startswith('http://') or _val.startswith('https://') or href_pattern.search(_val):
-                        total_intentos += 1
-            except Exception:
-                # Si un CSV falla, continuar con el siguiente
-                pass
-        print("\n" + "#"*60)
-        print(f"ANÁLISIS INICIAL: Se intentarán {total_intentos} descargas en {len(csv_files)} archivo(s) CSV.")
-        print("#"*60 + "\n")
-    except Exception:
-        # Si algo falla, continuar sin bloquear la ejecución
-        pass
+    # Asignar variables desde config
+    carpeta_descargas = config.get("carpeta_descargas", "descargas")
+    col_enlace = config.get("col_enlace")
+    usar_prefijo_columna = config.get("usar_prefijo_columna", "false").lower() == "true"
+    columna_prefijo = config.get("columna_prefijo", "")
+    tipo_prefijo = config.get("tipo_prefijo", "prefijo").strip().lower()
+    nombre_carpeta = config.get("Nombre_de_la_carpeta", "")
+    usar_carpeta_combinada = config.get("usar_carpeta_combinada", "false").lower() == "true"
+    columna_carpeta_1 = config.get("columna_carpeta_1", "")
+    columna_carpeta_2 = config.get("columna_carpeta_2", "")
+    separador_carpeta_combinada = config.get("separador_carpeta_combinada", "_")
+    separador_prefijo = config.get("separador_prefijo", "_")
+    # Si algún separador está vacío, usar espacio en blanco por defecto
+    if separador_carpeta_combinada == "":
+        separador_carpeta_combinada = " "
+    if separador_prefijo == "":
+        separador_prefijo = " "
+    # Soportar valor textual desde configuraciones antiguas
+    if str(separador_carpeta_combinada).strip().lower() == 'espacio en blanco':
+        separador_carpeta_combinada = ' '
+    if str(separador_prefijo).strip().lower() == 'espacio en blanco':
+        separador_prefijo = ' '
 
-    def obtener_nombre_unico(ruta_base, extension):
-        """Dada una ruta base sin extensión y una extensión, devuelve una ruta
-        única que no exista en disco, añadiendo sufijos -2, -3, ... si hace falta."""
-        contador = 1
-        ruta_final = f"{ruta_base}.{extension}"
-        while os.path.exists(ruta_final):
-            contador += 1
-            ruta_final = f"{ruta_base}-{contador}.{extension}"
-        return ruta_final
-
-    def _safe_folder_name(name: str) -> str:
-        r"""Devuelve un nombre de carpeta seguro para Windows.
-
-        - Reemplaza caracteres inválidos (< > : " / \ | ? *) por '_'.
-        - Elimina espacios al inicio/fin.
-        - No intenta recortar longitud por ser parte de la ruta, pero al
-          combinarse con otras partes, Windows impone un límite de 260 chars.
-    """
-        # Reemplazar caracteres inválidos en Windows y limpiar espacios extremos
-        invalid = '<>:"/\\|?*'
-        for ch in invalid:
-            name = name.replace(ch, '_')
-        return name.strip()
-
-    def _safe_file_stem(name: str) -> str:
-        """Devuelve un nombre de archivo (sin extensión) seguro para Windows.
-
-        - Reemplaza caracteres inválidos por '_'.
-        - Quita caracteres de control y puntos finales.
-        - Evita nombres reservados (CON, PRN, AUX, NUL, COM1.., LPT1..).
-        - Limita la longitud para evitar rutas excesivas.
-        """
-        # Reemplazar caracteres inválidos explícitos
-        invalid = '<>:"/\\|?*'
-        name = ''.join('_' if ch in invalid else ch for ch in name)
-        # Quitar caracteres de control (0-31) y normalizar otros no ASCII visibles
-        name = ''.join(ch if 32 <= ord(ch) < 127 else '_' for ch in name)
-        # Quitar espacios extremos y puntos al final (Windows no permite)
-        name = name.strip().rstrip('.')
-        # Evitar nombres reservados de Windows (case-insensitive)
-        reserved = {"CON","PRN","AUX","NUL"} | {f"COM{i}" for i in range(1,10)} | {f"LPT{i}" for i in range(1,10)}
-        if not name or name.upper() in reserved:
-            name = f"archivo_{int(time.time())}"
-        # Limitar longitud del "stem" para prevenir rutas demasiado largas
-        return name[:150]
-
-    def _url_to_safe_stem(url: str) -> str:
-        """Convierte una URL en un "stem" de nombre de archivo seguro.
-
-        - Usa sólo el último segmento de la ruta (sin la extensión).
-        - Descarta el query visible pero añade un hash corto del query (8 hex)
-          para evitar colisiones cuando distintas URLs comparten el mismo path.
-        - Sanea el resultado con `_safe_file_stem`.
-        """
-        try:
-            parsed = urlparse(url)
-            # Último segmento de la ruta (decodificado), sin extensión
-            last_seg = os.path.basename(unquote(parsed.path))
-            stem, _ext = os.path.splitext(last_seg)
-        except Exception:
-            stem = ''
-            parsed = None
-        if not stem:
-            stem = 'archivo'
-        # Si hay query, agregar huella breve para distinguir
-        try:
-            q = (parsed.query if parsed else '') or ''
-            if q:
-                digest = hashlib.sha1(q.encode('utf-8')).hexdigest()[:8]
-                stem = f"{stem}_{digest}"
-        except Exception:
-            pass
-        return _safe_file_stem(stem)
+    href_pattern = HREF_PATTERN
 
     # Normalizar nombres de columnas (el usuario puede haber dejado espacios al final)
     columna_prefijo_key = columna_prefijo.strip()
@@ -680,31 +718,12 @@ def procesar_csvs():
     # También normalizar clave de enlace
     col_enlace_key = (col_enlace or '').strip()
 
-    def resolve_col(df, configured_name: str) -> str:
-        """Dada una columna configurada, devolver el nombre real de la columna en df
-        aplicando strip y case-insensitive. Si no se encuentra, retornar ''."""
-        name = (configured_name or '').strip()
-        if not name:
-            return ''
-        if name in df.columns:
-            return name
-        lower_map = {c.lower(): c for c in df.columns}
-        return lower_map.get(name.lower(), '')
-
-    # Contadores de resumen
     total_archivos = 0
-    total_pdfs = 0
-    total_txts = 0
     errores = 0
-    total_bytes_descargados = 0
-
-    # Índice de progreso (solo filas con URL válida)
-    descarga_idx = 0
-    # Ventana móvil para ETA (últimas 10 descargas)
-    _times_window = deque(maxlen=10)
+    items = []
 
     for csv_file in csv_files:
-        print(f"Procesando: {csv_file}")
+        print(f"Planificando: {csv_file}")
         df = pd.read_csv(csv_file, encoding='latin-1', sep=';', quotechar='"')
         # Normalizar encabezados para evitar fallos por espacios
         try:
@@ -717,22 +736,22 @@ def procesar_csvs():
         comb1_col_resolved = resolve_col(df, columna_carpeta_1_key)
         comb2_col_resolved = resolve_col(df, columna_carpeta_2_key)
 
-        for _, row in df.iterrows():
+        for fila, (_, row) in enumerate(df.iterrows(), start=1):
             total_archivos += 1
             if not col_enlace_resolved:
                 print(f"ERROR: La columna de enlace configurada ('{col_enlace_key}') no existe en el CSV.")
                 errores += 1
                 break
             html = str(row[col_enlace_resolved])
-            # Determinar carpeta destino
-            carpeta_destino = carpeta_descargas
-            # Construcción de carpetas: si ambas opciones están activadas, anidar combinada dentro de la de prefijo/sufijo
+            # Construcción de carpetas (relativas a carpeta_descargas): si ambas
+            # opciones están activadas, anidar combinada dentro de la de prefijo/sufijo
+            carpeta_prefijo_rel = ''
+            valor_col_prefijo = val1 = val2 = ''
             if usar_prefijo_columna:
                 raw_val = row.get(prefijo_col_resolved, '') if prefijo_col_resolved else ''
                 # Tratar NaN como vacío
                 try:
-                    import pandas as _pd
-                    if _pd.isna(raw_val):
+                    if pd.isna(raw_val):
                         raw_val = ''
                 except Exception:
                     pass
@@ -753,124 +772,1215 @@ def procesar_csvs():
                     nombre_carpeta_prefijo = base_nombre
 
                 if nombre_carpeta_prefijo:
-                    nombre_carpeta_prefijo = _safe_folder_name(nombre_carpeta_prefijo)
-                    carpeta_prefijo_path = os.path.join(carpeta_descargas, nombre_carpeta_prefijo)
-                    os.makedirs(carpeta_prefijo_path, exist_ok=True)
-                else:
-                    carpeta_prefijo_path = None
-            else:
-                carpeta_prefijo_path = None
+                    carpeta_prefijo_rel = _safe_folder_name(nombre_carpeta_prefijo)
 
+            carpeta_rel = carpeta_prefijo_rel
             if usar_carpeta_combinada:
                 val1 = str(row.get(comb1_col_resolved, '')).strip() if comb1_col_resolved else ''
                 val2 = str(row.get(comb2_col_resolved, '')).strip() if comb2_col_resolved else ''
                 if val1 and val2:
                     nombre_carpeta_combinada = _safe_folder_name(f"{val1}{separador_carpeta_combinada}{val2}")
-                    parent = carpeta_prefijo_path if carpeta_prefijo_path else carpeta_descargas
-                    carpeta_destino = os.path.join(parent, nombre_carpeta_combinada)
-                    os.makedirs(carpeta_destino, exist_ok=True)
-                else:
-                    carpeta_destino = carpeta_prefijo_path if carpeta_prefijo_path else carpeta_descargas
+                    carpeta_rel = f"{carpeta_prefijo_rel}/{nombre_carpeta_combinada}" if carpeta_prefijo_rel else nombre_carpeta_combinada
+            url = _extraer_url(html, href_pattern)
+            if url:
+                items.append({
+                    'url': url,
+                    'dir': carpeta_rel,
+                    'stem': _url_to_safe_stem(url),
+                    'csv': csv_file,
+                    'fila': fila,
+                    'prefijo': valor_col_prefijo,
+                    'carpeta_1': val1,
+                    'carpeta_2': val2,
+                })
             else:
-                # Solo prefijo/sufijo
-                carpeta_destino = carpeta_prefijo_path if carpeta_prefijo_path else carpeta_descargas
-            # Obtener URL
-            if html.startswith('http://') or html.startswith('https://'):
-                url = html
+                print(f"No se pudo obtener una URL para descargar en la fila: {html}")
+                errores += 1
+
+    return {
+        'carpeta_descargas': carpeta_descargas,
+        'filas': total_archivos,
+        'errores': errores,
+        'items': items,
+    }
+
+def _extraer_url(html, href_pattern=HREF_PATTERN):
+    """Devuelve la URL de una celda (URL directa o HTML con href) o None."""
+    if html.startswith('http://') or html.startswith('https://'):
+        return html
+    match = href_pattern.search(html)
+    if match:
+        return match.group(1)
+    return None
+
+def guardar_plan(plan, ruta):
+    """Serializa el plan como JSON Lines: una cabecera y una línea por descarga.
+
+    Una línea por elemento permite inspeccionar o comparar planes con
+    herramientas de texto (diff, grep) sin cargarlos completos.
+    """
+    import json
+    with open(ruta, 'w', encoding='utf-8') as f:
+        cabecera = {
+            'plan': PLAN_FORMATO,
+            'version': SCRIPT_VERSION,
+            'carpeta_descargas': plan['carpeta_descargas'],
+            'filas': plan['filas'],
+            'errores': plan['errores'],
+        }
+        f.write(json.dumps(cabecera, ensure_ascii=False) + "\n")
+        for item in plan['items']:
+            f.write(json.dumps(item, ensure_ascii=False, separators=(',', ':')) + "\n")
+
+def cargar_plan(ruta):
+    """Lee un plan generado por `guardar_plan` y lo devuelve como diccionario."""
+    import json
+    with open(ruta, 'r', encoding='utf-8') as f:
+        cabecera = json.loads(f.readline() or '{}')
+        if cabecera.get('plan') != PLAN_FORMATO:
+            raise ValueError(f"El archivo '{ruta}' no es un plan de descargas válido.")
+        items = [json.loads(line) for line in f if line.strip()]
+    return {
+        'carpeta_descargas': cabecera.get('carpeta_descargas', 'descargas'),
+        'filas': cabecera.get('filas', len(items)),
+        'errores': cabecera.get('errores', 0),
+        'items': items,
+    }
+
+# --- Planificación por tamaño ---
+def _opcion_numero(config, clave, defecto, minimo=0, tipo=int):
+    """Lee una opción numérica de config, con valor por defecto y mínimo."""
+    try:
+        return max(minimo, tipo(str(config.get(clave, defecto)).strip()))
+    except ValueError:
+        return defecto
+
+def _leer_opciones_descarga(config):
+    """Lee de config las opciones de rendimiento de la etapa de descarga."""
+    return {
+        'simultaneas': _opcion_numero(config, 'descargas_simultaneas', 4, 1),
+        'umbral_grande': _opcion_numero(config, 'umbral_archivo_grande_mb', 20, 1) * 1024 * 1024,
+        'max_grandes': _opcion_numero(config, 'max_descargas_grandes', 1, 1),
+        'consultar_tamano': config.get('consultar_tamano', 'false').strip().lower() == 'true',
+        'archivo_tamanos': config.get('archivo_tamanos', 'tamanos_conocidos.json').strip(),
+        'escritores': _opcion_numero(config, 'escritores_disco', 2, 1),
+        'memoria_escritura': _opcion_numero(config, 'memoria_escritura_mb', 256, 1) * 1024 * 1024,
+        'plazos': {
+            'conexion': _opcion_numero(config, 'timeout_conexion', 10.0, 0.1, float),
+            'primer_byte': _opcion_numero(config, 'timeout_primer_byte', 30.0, 0.1, float),
+            'total': _opcion_numero(config, 'timeout_total', 600.0, 0, float),
+        },
+        'duplicar_lentas': config.get('duplicar_peticiones_lentas', 'false').strip().lower() == 'true',
+        'archivo_indice': config.get('archivo_indice', 'indice_descargas.sqlite').strip(),
+    }
+
+def _cargar_tamanos(ruta):
+    """Lee el registro {url: bytes} guardado por ejecuciones anteriores."""
+    import json
+    if not ruta:
+        return {}
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return {u: int(t) for u, t in json.load(f).items()}
+    except (OSError, ValueError, TypeError, AttributeError):
+        return {}
+
+def _guardar_tamanos(ruta, tamanos):
+    """Guarda el registro de tamaños de forma atómica (archivo temporal + replace)."""
+    import json
+    if not ruta:
+        return
+    try:
+        tmp = f"{ruta}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(tamanos, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, ruta)
+    except OSError as e:
+        print(f"No se pudo guardar el registro de tamaños '{ruta}': {e}")
+
+def _consultar_tamanos(session, urls, tamanos, simultaneas, plazos):
+    """Completa `tamanos` con el Content-Length (HEAD en paralelo) de `urls`."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _head(url):
+        try:
+            r = session.head(url, allow_redirects=True, timeout=(plazos['conexion'], plazos['primer_byte']))
+            return url, int(r.headers.get('Content-Length', ''))
+        except Exception:
+            return url, None
+
+    with ThreadPoolExecutor(max_workers=simultaneas) as ex:
+        for url, tam in ex.map(_head, urls):
+            if tam is not None:
+                tamanos[url] = tam
+
+class _ColaPorTamano:
+    """Cola de descargas que prioriza archivos pequeños y limita los grandes.
+
+    - Tamaño conocido bajo el umbral: de menor a mayor.
+    - Tamaño desconocido: después de los pequeños conocidos, en orden del plan.
+    - Grandes (>= umbral): se intercalan con los pequeños, con a lo sumo
+      `max_grandes` en curso y dejando al menos un trabajador para los
+      pequeños cuando hay más de uno.
+    """
+    def __init__(self, items, tamanos, umbral, max_grandes, trabajadores):
+        self._cond = threading.Condition()
+        pequenos = []
+        grandes = []
+        for orden, item in enumerate(items):
+            tam = tamanos.get(item['url'])
+            if tam is None:
+                pequenos.append(((1, 0, orden), item))
+            elif tam >= umbral:
+                grandes.append(((tam, orden), item))
             else:
-                match = href_pattern.search(html)
-                if match:
-                    url = match.group(1)
-                else:
-                    url = None
-            if url:
-                # Actualizar progreso
-                descarga_idx += 1
-                percent_done = int(round((descarga_idx / total_intentos) * 100)) if total_intentos else 0
-                quedan = max(total_intentos - descarga_idx, 0)
-                # Obtener un nombre base seguro derivado de la URL
-                nombre_base_seguro = _url_to_safe_stem(url)
-                ruta_base = os.path.join(carpeta_destino, nombre_base_seguro)
-                ruta_archivo = obtener_nombre_unico(ruta_base, "pdf")
-                ruta_txt = obtener_nombre_unico(ruta_base, "txt")
+                pequenos.append(((0, tam, orden), item))
+        pequenos.sort(key=lambda t: t[0])
+        grandes.sort(key=lambda t: t[0])
+        self._pequenos = deque(item for _, item in pequenos)
+        self._grandes = deque(item for _, item in grandes)
+        self._limite = min(max_grandes, max(trabajadores - 1, 0))
+        self._tope = max(self._limite, 1)
+        self._grandes_en_curso = 0
+
+    def tomar(self):
+        """Devuelve (item, es_grande), o None cuando ya no quedan elementos."""
+        with self._cond:
+            while True:
+                if self._grandes and self._grandes_en_curso < self._limite:
+                    break
+                if self._pequenos:
+                    return self._pequenos.popleft(), False
+                if not self._grandes:
+                    return None
+                if self._grandes_en_curso < self._tope:
+                    break
+                self._cond.wait()
+            self._grandes_en_curso += 1
+            return self._grandes.popleft(), True
+
+    def terminar(self, es_grande):
+        """Marca como terminado un elemento entregado por `tomar`."""
+        if es_grande:
+            with self._cond:
+                self._grandes_en_curso -= 1
+                self._cond.notify_all()
+
+# --- Plazos y peticiones de respaldo ---
+def _percentil(valores, p):
+    """Percentil `p` (0-100) por rango más cercano; 0 si no hay valores."""
+    if not valores:
+        return 0.0
+    orden = sorted(valores)
+    idx = max(0, min(len(orden) - 1, int(math.ceil(p / 100 * len(orden))) - 1))
+    return orden[idx]
+
+class _Cancelado(Exception):
+    """Intento abortado porque otro intento de la misma descarga terminó antes."""
+
+def _lector_parcial(response):
+    """Función `leer(n)` que hace una sola lectura del socket y devuelve lo
+    disponible (hasta `n` bytes, b'' al final), o None si la respuesta no la
+    ofrece (sesiones de prueba, cuerpos comprimidos con urllib3 1.x)."""
+    raw = getattr(response, 'raw', None)
+    if hasattr(raw, 'read1'):
+        # urllib3 2.x: decodifica gzip/deflate igual que iter_content
+        return lambda n: raw.read1(n, decode_content=True)
+    fp = getattr(raw, '_fp', None)
+    if hasattr(fp, 'read1') and not raw.headers.get('Content-Encoding'):
+        # urllib3 1.x: leer directo de http.client (maneja chunked)
+        return fp.read1
+    return None
+
+def _socket_de(response):
+    """Socket de la conexión de `response`, o None si no se puede obtener."""
+    raw = getattr(response, 'raw', None)
+    sock = getattr(getattr(raw, '_connection', None), 'sock', None)
+    if sock is None:
+        fp = getattr(getattr(raw, '_fp', None), 'fp', None)
+        sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+    return sock
+
+def _leer_cuerpo(response, plazos, inicio, tamano=16 * 1024):
+    """Genera las partes del cuerpo de `response` respetando `plazos['total']`.
+
+    El plazo (contado desde `inicio`, reloj monotónico) se comprueba en cada
+    lectura del socket: antes de leer, el timeout del socket se reduce al
+    tiempo restante y se lee con `read1`, que vuelve con lo que haya llegado.
+    Así un servidor que envía datos a goteo no retiene la llamada hasta
+    completar un bloque.
+    """
+    mensaje = f"La descarga superó el plazo total de {plazos['total']:g} s"
+    leer = _lector_parcial(response) if plazos['total'] else None
+    if leer is None:
+        # Sin lectura parcial disponible: el plazo se comprueba entre bloques
+        for parte in response.iter_content(chunk_size=tamano):
+            yield parte
+            if plazos['total'] and time.monotonic() - inicio > plazos['total']:
+                raise TimeoutError(mensaje)
+        return
+    limite = inicio + plazos['total']
+    sock = _socket_de(response)
+    while True:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            raise TimeoutError(mensaje)
+        if sock is not None:
+            sock.settimeout(min(plazos['primer_byte'], restante))
+        try:
+            parte = leer(tamano)
+        except Exception:
+            if time.monotonic() >= limite:
+                raise TimeoutError(mensaje) from None
+            raise
+        if not parte:
+            return
+        yield parte
+
+def _get_con_plazos(session, url, plazos, cancelar=None, primer_byte=None):
+    """GET en streaming con plazos de conexión, primer byte y transferencia total.
+
+    Devuelve (response, contenido, segundos_hasta_primer_byte). Lanza
+    `TimeoutError` si la transferencia supera `plazos['total']` (ver
+    `_leer_cuerpo`) y `_Cancelado` si `cancelar` se activa mientras se
+    recibe el cuerpo.
+    """
+    inicio = time.monotonic()
+    response = session.get(url, stream=True, timeout=(plazos['conexion'], plazos['primer_byte']))
+    ttfb = time.monotonic() - inicio
+    if primer_byte is not None:
+        primer_byte.set()
+    try:
+        partes = []
+        for parte in _leer_cuerpo(response, plazos, inicio):
+            if cancelar is not None and cancelar.is_set():
+                raise _Cancelado(ttfb)
+            partes.append(parte)
+        contenido = b''.join(partes)
+    finally:
+        response.close()
+    return response, contenido, ttfb
+
+class _Coberturas:
+    """Peticiones de respaldo ("hedged requests") y sus estadísticas.
+
+    Guarda, por servidor, las últimas latencias hasta el primer byte. Si una
+    descarga no recibe respuesta tras el p95 de su servidor, se lanza un
+    segundo intento y se conserva el que termine primero.
+    """
+    MIN_MUESTRAS = 20
+
+    def __init__(self, activo):
+        self.activo = activo
+        self._lock = threading.Lock()
+        self._ttfb = {}
+        self.disparos = 0
+        self.ganadas = 0
+        self._con = []
+        self._sin = []
+        # Intentos originales que perdieron contra su respaldo y siguen en curso
+        self._perdedores = []
+
+    def umbral(self, host):
+        """p95 del primer byte para `host`, o None si aún no hay muestras suficientes."""
+        with self._lock:
+            muestras = self._ttfb.get(host)
+            if not self.activo or not muestras or len(muestras) < self.MIN_MUESTRAS:
+                return None
+            return max(0.05, _percentil(muestras, 95))
+
+    def registrar_ttfb(self, host, segundos):
+        with self._lock:
+            self._ttfb.setdefault(host, deque(maxlen=200)).append(segundos)
+
+    def registrar(self, con_respaldo=None, sin_respaldo=None):
+        """Registra la latencia observada y la estimada sin respaldo."""
+        with self._lock:
+            if con_respaldo is not None:
+                self._con.append(con_respaldo)
+            if sin_respaldo is not None:
+                self._sin.append(sin_respaldo)
+
+    def seguir_perdedor(self, perdedor):
+        """Anota un intento original que quedó en curso tras disparar su respaldo."""
+        with self._lock:
+            self._perdedores.append(perdedor)
+
+    def registrar_perdedor(self, perdedor, segundos):
+        """Registra la latencia sin respaldo de `perdedor`, una sola vez."""
+        with self._lock:
+            if not perdedor['registrado']:
+                perdedor['registrado'] = True
+                self._sin.append(segundos)
+
+    def esperar_perdedores(self, plazo):
+        """Espera hasta `plazo` segundos a los intentos originales en curso.
+
+        Los que no terminan se registran con el tiempo transcurrido como cota
+        inferior, para que el p99 sin respaldo no quede subestimado.
+        """
+        with self._lock:
+            perdedores, self._perdedores = self._perdedores, []
+        limite = time.monotonic() + plazo
+        for perdedor in perdedores:
+            perdedor['hilo'].join(max(0.0, limite - time.monotonic()))
+        for perdedor in perdedores:
+            self.registrar_perdedor(perdedor, time.monotonic() - perdedor['inicio'])
+
+    def percentil(self, p):
+        """Percentil `p` de la latencia observada por descarga (con respaldo)."""
+        with self._lock:
+            return _percentil(self._con, p)
+
+    def contar(self, disparos=0, ganadas=0):
+        with self._lock:
+            self.disparos += disparos
+            self.ganadas += ganadas
+
+    def resumen(self):
+        with self._lock:
+            return {
+                'activo': self.activo,
+                'disparos': self.disparos,
+                'ganadas': self.ganadas,
+                'p99_con': _percentil(self._con, 99),
+                'p99_sin': _percentil(self._sin, 99),
+            }
+
+def _descargar_con_plazos(session, url, plazos, coberturas):
+    """Descarga `url` con plazos y, si corresponde, con una petición de respaldo.
+
+    Devuelve (response, contenido). Cuando el respaldo gana, el intento
+    original se cancela al recibir su primer byte; su latencia sin respaldo
+    se estima como su primer byte más la transferencia del ganador (o como el
+    tiempo hasta su error, si falla).
+    """
+    import queue
+    host = urlparse(url).netloc
+    umbral = coberturas.umbral(host)
+    inicio = time.monotonic()
+    if umbral is None:
+        try:
+            response, contenido, ttfb = _get_con_plazos(session, url, plazos)
+            coberturas.registrar_ttfb(host, ttfb)
+        finally:
+            # También los intentos fallidos (plazos, conexión): son la cola
+            total = time.monotonic() - inicio
+            coberturas.registrar(total, total)
+        return response, contenido
+
+    cancelar = threading.Event()
+    primer_byte = threading.Event()
+    resultados = queue.Queue()
+    estado = {'respaldo': False, 'transferencia': 0.0}
+
+    def _intento(n):
+        try:
+            r = _get_con_plazos(session, url, plazos, cancelar, primer_byte)
+            resultados.put((n, r, None))
+        except _Cancelado as e:
+            # Intento original perdedor: estimar cuánto habría tardado
+            if n == 0:
+                coberturas.registrar_perdedor(original, e.args[0] + estado['transferencia'])
+        except Exception as e:
+            if n == 0 and estado['respaldo']:
+                coberturas.registrar_perdedor(original, time.monotonic() - inicio)
+            resultados.put((n, None, e))
+
+    original = {'hilo': threading.Thread(target=_intento, args=(0,), daemon=True),
+                'inicio': inicio, 'registrado': False}
+    original['hilo'].start()
+    if not primer_byte.wait(umbral) and resultados.empty():
+        estado['respaldo'] = True
+        coberturas.seguir_perdedor(original)
+        threading.Thread(target=_intento, args=(1,), daemon=True).start()
+        coberturas.contar(disparos=1)
+
+    ganador = None
+    errores = []
+    for _ in range(2 if estado['respaldo'] else 1):
+        n, r, error = resultados.get()
+        if error is None:
+            ganador = (n, r)
+            break
+        errores.append(error)
+    total = time.monotonic() - inicio
+    if ganador is None:
+        coberturas.registrar(total, None if estado['respaldo'] else total)
+        raise errores[0]
+    n, (response, contenido, ttfb) = ganador
+    # Tiempo de transferencia del ganador (sin su espera hasta el primer byte)
+    estado['transferencia'] = max(0.0, total - (umbral if n == 1 else 0) - ttfb)
+    cancelar.set()
+    coberturas.registrar_ttfb(host, ttfb)
+    if n == 1:
+        coberturas.contar(ganadas=1)
+        coberturas.registrar(con_respaldo=total)
+    else:
+        coberturas.registrar(con_respaldo=total)
+        coberturas.registrar_perdedor(original, total)
+    return response, contenido
+
+# --- Escritura diferida ---
+class _EscritorDisco:
+    """Etapa de escritura diferida ("write-behind") de los archivos descargados.
+
+    Los hilos de descarga entregan (ruta, datos) y siguen con la siguiente
+    petición; `hilos` escritores hacen el `open(...).write(...)`. Cada carpeta
+    se asigna siempre al mismo escritor, que agrupa por carpeta lo que tenga
+    pendiente. Los datos en espera se limitan a `max_bytes`: si el disco no
+    da abasto, `escribir` se bloquea (contrapresión) en lugar de acumular
+    descargas en memoria. Las sumas de integridad de un lote se agregan con
+    una sola escritura por carpeta (ver `registrar_sumas`).
+    """
+    def __init__(self, hilos=2, max_bytes=256 * 1024 * 1024):
+        import queue
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._cond = threading.Condition()
+        self._colas = [queue.Queue() for _ in range(max(1, hilos))]
+        self._hilos = [threading.Thread(target=self._bucle, args=(c,), daemon=True) for c in self._colas]
+        self.max_pendientes = 0
+        for hilo in self._hilos:
+            hilo.start()
+
+    def pendientes(self):
+        """Cantidad de archivos entregados que aún no se escriben."""
+        return sum(c.qsize() for c in self._colas)
+
+    def escribir(self, ruta, datos, al_terminar=None, suma=False):
+        """Encola `datos` para `ruta`; `al_terminar(ruta, datos, error)` se
+        llama desde el hilo escritor (error es None si todo fue bien). Con
+        `suma=True` el archivo se anota en el registro de integridad."""
+        with self._cond:
+            # Un archivo mayor que el límite pasa solo cuando la cola está vacía
+            while self._bytes and self._bytes + len(datos) > self._max_bytes:
+                self._cond.wait()
+            self._bytes += len(datos)
+        carpeta = os.path.dirname(ruta)
+        self._colas[hash(carpeta) % len(self._colas)].put((carpeta, ruta, datos, al_terminar, suma))
+        self.max_pendientes = max(self.max_pendientes, self.pendientes())
+
+    def cerrar(self):
+        """Espera a que se escriba todo lo pendiente y detiene los escritores."""
+        for cola in self._colas:
+            cola.put(None)
+        for hilo in self._hilos:
+            hilo.join()
+
+    def _bucle(self, cola):
+        import queue
+        from itertools import groupby
+        fin = False
+        while not fin:
+            lote = [cola.get()]
+            # Tomar todo lo que ya esté pendiente para agruparlo por carpeta
+            while True:
                 try:
-                    _t0 = time.time()
-                    response = requests.get(url, verify=False)
-                    _elapsed = time.time() - _t0
+                    lote.append(cola.get_nowait())
+                except queue.Empty:
+                    break
+            fin = lote[-1] is None
+            lote = [t for t in lote if t is not None]
+            lote.sort(key=lambda t: t[0])
+            for carpeta, grupo in groupby(lote, key=lambda t: t[0]):
+                hechos = []
+                lineas = []
+                for _carpeta, ruta, datos, al_terminar, suma in grupo:
+                    error = None
                     try:
-                        _times_window.append(_elapsed)
-                    except Exception:
-                        pass
-                    _avg = (sum(_times_window) / len(_times_window)) if len(_times_window) else 0
-                    _eta_secs = int(round(quedan * _avg)) if _avg > 0 else 0
-                    _bar = _progress_bar(descarga_idx, total_intentos, 30)
-                    # Mostrar como tabla con progreso y tamaños legibles
-                    tam_str = human_size(len(response.content) if response.content is not None else 0)
-                    encabezado = f" {descarga_idx} / {total_intentos} - {percent_done}% {_bar} Tiempo restante: {_format_seconds(_eta_secs)}\n"
-                    tabla = "\n" + encabezado
-                    tabla += "="*60 + "\n"
-                    tabla += f"| {'Campo':<20} | {'Valor':<35} |\n"
-                    tabla += f"|{'-'*20}|{'-'*35}|\n"
-                    tabla += f"| {'Archivo':<20} | {ruta_archivo:<35} |\n"
-                    tabla += f"| {'Enlace':<20} | {url:<35} |\n"
-                    tabla += f"| {'Status HTTP':<20} | {response.status_code:<35} |\n"
-                    tabla += f"| {'Tamaño recibido':<20} | {tam_str:<35} |\n"
-                    tabla += f"| {'Tipo de contenido':<20} | {response.headers.get('Content-Type', 'N/A'):<35} |\n"
-                    tabla += f"| {'Quedan':<20} | {quedan:<35} |\n"
-                    if response.status_code == 200 and response.content:
-                        with open(ruta_archivo, "wb") as f:
-                            f.write(response.content)
-                        tabla += f"| {'Resultado':<20} | {'PDF descargado correctamente.':<35} |\n"
+                        with open(ruta, "wb") as f:
+                            f.write(datos)
+                        if suma:
+                            lineas.append(_linea_suma(ruta, datos))
+                    except OSError as e:
+                        error = e
+                    with self._cond:
+                        self._bytes -= len(datos)
+                        self._cond.notify_all()
+                    hechos.append((ruta, datos, al_terminar, error))
+                # Un solo append al registro de integridad por carpeta y lote
+                if lineas:
+                    try:
+                        registrar_sumas(carpeta, lineas)
+                    except OSError as e:
+                        print(f"No se pudo registrar las sumas en {carpeta}: {e}")
+                for ruta, datos, al_terminar, error in hechos:
+                    if al_terminar is not None:
                         try:
-                            total_bytes_descargados += len(response.content)
+                            al_terminar(ruta, datos, error)
                         except Exception:
                             pass
-                        total_pdfs += 1
-                    else:
-                        with open(ruta_txt, "w", encoding="utf-8") as f:
-                            f.write(url)
-                        tabla += f"| {'Resultado':<20} | {'No se pudo descargar el PDF. Se creó el TXT con el enlace.':<35} |\n"
-                        total_txts += 1
-                    tabla += "="*60 + "\n"
-                    print(tabla)
-                except Exception as e:
-                    # Intentar guardar TXT con el enlace
-                    txt_creado = False
-                    _elapsed = time.time() - _t0 if '_t0' in locals() else 0
+
+# --- Integridad del árbol de descargas ---
+# Registro por carpeta con "sha256<TAB>bytes<TAB>nombre" de cada PDF guardado
+SUMAS_INTEGRIDAD = '.sumas.tsv'
+
+def _linea_suma(ruta, datos):
+    """Línea del registro de integridad para `datos` guardados en `ruta`."""
+    return f"{hashlib.sha256(datos).hexdigest()}\t{len(datos)}\t{os.path.basename(ruta)}\n"
+
+def registrar_sumas(carpeta, lineas):
+    """Agrega `lineas` (de `_linea_suma`) al registro de integridad de `carpeta`.
+
+    Se llama desde el hilo escritor una vez por carpeta y lote; como cada
+    carpeta tiene siempre el mismo escritor, los registros no se intercalan.
+    """
+    with open(os.path.join(carpeta, SUMAS_INTEGRIDAD), 'a', encoding='utf-8') as f:
+        f.write(''.join(lineas))
+
+def _leer_sumas(carpeta):
+    """Devuelve {nombre: (sha256, bytes)} del registro de `carpeta` (vacío si no hay)."""
+    sumas = {}
+    try:
+        with open(os.path.join(carpeta, SUMAS_INTEGRIDAD), 'r', encoding='utf-8') as f:
+            for line in f:
+                partes = line.rstrip('\r\n').split('\t', 2)
+                if len(partes) == 3 and partes[1].isdigit():
+                    # Si un nombre aparece más de una vez, vale el último registro
+                    sumas[partes[2]] = (partes[0], int(partes[1]))
+    except FileNotFoundError:
+        pass
+    return sumas
+
+def _sha256_archivo(ruta, bloque=1024 * 1024):
+    """SHA-256 de un archivo leído en bloques secuenciales grandes."""
+    h = hashlib.sha256()
+    with open(ruta, 'rb', buffering=0) as f:
+        while True:
+            datos = f.read(bloque)
+            if not datos:
+                break
+            h.update(datos)
+    return h.hexdigest()
+
+def _comprobar_archivo(ruta, sha, tamano):
+    """Estado de un archivo frente a su registro: ok, faltante, truncado,
+    tamano_distinto, corrupto o ilegible (error de E/S o de permisos).
+    El tamaño se revisa antes de leer el archivo."""
+    try:
+        actual = os.stat(ruta).st_size
+        if actual < tamano:
+            return 'truncado'
+        if actual != tamano:
+            return 'tamano_distinto'
+        return 'ok' if _sha256_archivo(ruta) == sha else 'corrupto'
+    except FileNotFoundError:
+        return 'faltante'
+    except OSError:
+        return 'ilegible'
+
+def verificar_integridad(carpeta_descargas, hilos=None):
+    """Recalcula en paralelo los SHA-256 del árbol y los compara con los registros.
+
+    Usa hilos (hashlib y la lectura de disco liberan el GIL) para repartir el
+    trabajo entre los núcleos. Devuelve (conteo_por_estado, problemas), donde
+    problemas es una lista de (ruta, estado) que incluye los PDF sin registro.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    tareas = []
+    problemas = []
+    for raiz, _dirs, archivos in os.walk(carpeta_descargas):
+        sumas = _leer_sumas(raiz)
+        for nombre, (sha, tamano) in sumas.items():
+            tareas.append((os.path.join(raiz, nombre), sha, tamano))
+        for nombre in archivos:
+            if nombre.lower().endswith('.pdf') and nombre not in sumas:
+                problemas.append((os.path.join(raiz, nombre), 'sin_registro'))
+
+    conteo = {'sin_registro': len(problemas)}
+    inicio = time.time()
+    with ThreadPoolExecutor(max_workers=hilos or os.cpu_count() or 4) as ex:
+        estados = ex.map(lambda t: _comprobar_archivo(*t), tareas)
+        for n, ((ruta, _sha, _tam), estado) in enumerate(zip(tareas, estados), start=1):
+            conteo[estado] = conteo.get(estado, 0) + 1
+            if estado != 'ok':
+                problemas.append((ruta, estado))
+            if n % 1000 == 0 or n == len(tareas):
+                print(f" {n} / {len(tareas)} {_progress_bar(n, len(tareas), 30)} {_format_seconds(time.time() - inicio)}")
+    return conteo, problemas
+
+# --- Índice de metadatos ---
+ESQUEMA_INDICE = """
+CREATE TABLE IF NOT EXISTS archivos (
+    id INTEGER PRIMARY KEY,
+    csv TEXT,
+    fila INTEGER,
+    url TEXT,
+    valor_prefijo TEXT,
+    valor_carpeta_1 TEXT,
+    valor_carpeta_2 TEXT,
+    ruta TEXT,
+    bytes INTEGER,
+    estado TEXT,
+    http_status INTEGER,
+    fecha TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_archivos_url ON archivos(url);
+CREATE INDEX IF NOT EXISTS ix_archivos_ruta ON archivos(ruta);
+CREATE INDEX IF NOT EXISTS ix_archivos_csv_fila ON archivos(csv, fila);
+CREATE INDEX IF NOT EXISTS ix_archivos_prefijo ON archivos(valor_prefijo);
+CREATE INDEX IF NOT EXISTS ix_archivos_carpeta_1 ON archivos(valor_carpeta_1);
+CREATE INDEX IF NOT EXISTS ix_archivos_carpeta_2 ON archivos(valor_carpeta_2);
+CREATE INDEX IF NOT EXISTS ix_archivos_estado ON archivos(estado);
+"""
+
+class _IndiceDescargas:
+    """Índice SQLite con una fila por archivo guardado (PDF o TXT).
+
+    Un único hilo escribe en la base: los escritores de disco encolan los
+    registros y este hilo los confirma en transacciones agrupadas, para que
+    los bloqueos de SQLite no frenen las descargas. Las rutas se guardan
+    normalizadas (os.path.normpath) para que un reintento encuentre el
+    registro de su TXT aunque la ruta se haya armado de otra forma.
+    """
+    def __init__(self, ruta):
+        import queue
+        import sqlite3
+        self._ruta = ruta
+        self._cola = queue.Queue()
+        # Crear el esquema aquí para que un error de ruta se vea al inicio
+        conn = sqlite3.connect(ruta)
+        try:
+            conn.executescript(ESQUEMA_INDICE)
+        finally:
+            conn.close()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+        self._hilo.start()
+
+    @staticmethod
+    def _fila(item, ruta, estado, tamano, http_status):
+        from datetime import datetime
+        return (item.get('csv', ''), item.get('fila') or None, item['url'],
+                item.get('prefijo', ''), item.get('carpeta_1', ''), item.get('carpeta_2', ''),
+                os.path.normpath(ruta), tamano, estado, http_status, datetime.now().isoformat(timespec='seconds'))
+
+    def registrar(self, item, ruta, estado, tamano=None, http_status=None):
+        """Agrega el registro de un archivo guardado en `ruta`."""
+        self._cola.put(('insertar', self._fila(item, ruta, estado, tamano, http_status)))
+
+    def reemplazar(self, item, ruta_txt, ruta, tamano, http_status=None):
+        """Actualiza el registro de un TXT reintentado con su PDF (o lo crea)."""
+        self._cola.put(('reemplazar', (os.path.normpath(ruta_txt), self._fila(item, ruta, 'pdf', tamano, http_status))))
+
+    def cerrar(self):
+        """Espera a que se confirmen todos los registros pendientes."""
+        self._cola.put(None)
+        self._hilo.join()
+
+    def _bucle(self):
+        import queue
+        import sqlite3
+        insertar = ("INSERT INTO archivos (csv, fila, url, valor_prefijo, valor_carpeta_1, valor_carpeta_2, "
+                    "ruta, bytes, estado, http_status, fecha) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+        conn = sqlite3.connect(self._ruta)
+        fin = False
+        while not fin:
+            lote = [self._cola.get()]
+            while True:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            fin = lote[-1] is None
+            try:
+                with conn:
+                    for op in lote:
+                        if op is None:
+                            continue
+                        tipo, datos = op
+                        if tipo == 'insertar':
+                            conn.execute(insertar, datos)
+                            continue
+                        ruta_txt, fila = datos
+                        cur = conn.execute(
+                            "UPDATE archivos SET ruta = ?, bytes = ?, estado = ?, http_status = ?, fecha = ? WHERE ruta = ?",
+                            (fila[6], fila[7], fila[8], fila[9], fila[10], ruta_txt))
+                        if cur.rowcount == 0:
+                            conn.execute(insertar, fila)
+            except sqlite3.Error as e:
+                print(f"ERROR al actualizar el índice '{self._ruta}': {e}")
+        conn.close()
+
+def buscar_en_indice(ruta_indice, texto, limite=50):
+    """Busca `texto` (igualdad exacta) en URL, ruta, CSV y columnas de carpeta.
+
+    Cada condición usa su propio índice, por lo que la consulta no recorre
+    la tabla completa.
+    """
+    import sqlite3
+    conn = sqlite3.connect(ruta_indice)
+    try:
+        return conn.execute(
+            "SELECT csv, fila, valor_prefijo, valor_carpeta_1, valor_carpeta_2, estado, bytes, ruta, url "
+            "FROM archivos WHERE url = ? OR ruta = ? OR csv = ? OR valor_prefijo = ? "
+            "OR valor_carpeta_1 = ? OR valor_carpeta_2 = ? LIMIT ?",
+            (texto, os.path.normpath(texto)) + (texto,) * 4 + (limite,)).fetchall()
+    finally:
+        conn.close()
+
+# --- Ejecución del plan ---
+# Índice (en carpeta_descargas) con las rutas relativas de los TXT pendientes
+INDICE_PENDIENTES = '.pendientes.txt'
+
+def ejecutar_plan(plan, session, carpeta_descargas=None, config=None):
+    """Descarga los elementos de un plan usando la sesión HTTP dada.
+
+    `carpeta_descargas` permite reubicar el árbol destino (p.ej. al ejecutar
+    en otra máquina); por defecto se usa la carpeta registrada en el plan.
+
+    Las descargas se reparten entre `descargas_simultaneas` hilos que toman
+    los elementos de una `_ColaPorTamano`: primero los archivos pequeños,
+    usando los tamaños de ejecuciones anteriores (`archivo_tamanos`) y,
+    si `consultar_tamano` está activo, un HEAD previo por cada URL nueva.
+    Devuelve un diccionario con los contadores para el resumen final.
+    """
+    config = config if config is not None else leer_config()
+    opciones = _leer_opciones_descarga(config)
+    carpeta_descargas = carpeta_descargas or plan['carpeta_descargas']
+    items = plan['items']
+
+    # Crear carpeta de descarga si no existe
+    os.makedirs(carpeta_descargas, exist_ok=True)
+
+    # --- Análisis inicial: descargas a intentar (ya resueltas en el plan) ---
+    total_intentos = len(items)
+    print("\n" + "#"*60)
+    print(f"ANÁLISIS INICIAL: Se intentarán {total_intentos} descargas en {len({i['csv'] for i in items if i['csv']})} archivo(s) CSV.")
+    print("#"*60 + "\n")
+
+    # Tamaños conocidos para ordenar la cola
+    tamanos = _cargar_tamanos(opciones['archivo_tamanos'])
+    if opciones['consultar_tamano']:
+        sin_tamano = [u for u in dict.fromkeys(i['url'] for i in items) if u not in tamanos]
+        if sin_tamano:
+            print(f"Consultando el tamaño de {len(sin_tamano)} enlace(s)...")
+            _consultar_tamanos(session, sin_tamano, tamanos, opciones['simultaneas'], opciones['plazos'])
+    cola = _ColaPorTamano(items, tamanos, opciones['umbral_grande'],
+                          opciones['max_grandes'], opciones['simultaneas'])
+
+    # Contadores de resumen (compartidos entre hilos, protegidos por `lock`)
+    lock = threading.Lock()
+    cont = {
+        'descarga_idx': 0,
+        'total_pdfs': 0,
+        'total_txts': 0,
+        'errores': plan['errores'],
+        'total_bytes_descargados': 0,
+    }
+    # Ventana móvil para ETA (últimas 10 descargas)
+    _times_window = deque(maxlen=10)
+    # Carpetas ya creadas (evita un makedirs por cada fila)
+    carpetas_creadas = set()
+    # Rutas asignadas en esta ejecución y aún no escritas por otro hilo
+    rutas_reservadas = set()
+    # Peticiones de respaldo (si están activas) y sus estadísticas
+    coberturas = _Coberturas(opciones['duplicar_lentas'])
+    # Índice de los TXT generados (lo usa el modo 'reintentar')
+    indice_pendientes = os.path.join(carpeta_descargas, INDICE_PENDIENTES)
+    # Índice SQLite de metadatos (fila del CSV -> archivo), si está configurado
+    indice = _IndiceDescargas(opciones['archivo_indice']) if opciones['archivo_indice'] else None
+    # Escritura diferida: los hilos de descarga no esperan al disco
+    escritor = _EscritorDisco(opciones['escritores'], opciones['memoria_escritura'])
+
+    def _reservar(ruta_base, extension):
+        with lock:
+            ruta = obtener_nombre_unico(ruta_base, extension, rutas_reservadas)
+            rutas_reservadas.add(ruta)
+        return ruta
+
+    def _avance(elapsed):
+        # Registrar una descarga terminada y armar el encabezado de progreso
+        with lock:
+            cont['descarga_idx'] += 1
+            descarga_idx = cont['descarga_idx']
+            _times_window.append(elapsed)
+            _avg = (sum(_times_window) / len(_times_window)) / opciones['simultaneas']
+        percent_done = int(round((descarga_idx / total_intentos) * 100)) if total_intentos else 0
+        quedan = max(total_intentos - descarga_idx, 0)
+        _eta_secs = int(round(quedan * _avg)) if _avg > 0 else 0
+        _bar = _progress_bar(descarga_idx, total_intentos, 30)
+        encabezado = f" {descarga_idx} / {total_intentos} - {percent_done}% {_bar} Tiempo restante: {_format_seconds(_eta_secs)}\n"
+        return encabezado, quedan
+
+    def _sumar(**valores):
+        with lock:
+            for k, v in valores.items():
+                cont[k] += v
+
+    def _descargar(item):
+        url = item['url']
+        # 'dir' se guarda con '/': convertir al separador del sistema
+        carpeta_destino = os.path.join(carpeta_descargas, *item['dir'].split('/')) if item['dir'] else carpeta_descargas
+        # Nombre base seguro derivado de la URL (calculado al planificar)
+        ruta_base = os.path.join(carpeta_destino, item['stem'])
+        encabezado = None
+        _t0 = time.time()
+        try:
+            # Dentro del try: una carpeta imposible de crear cuenta como error
+            if carpeta_destino not in carpetas_creadas:
+                os.makedirs(carpeta_destino, exist_ok=True)
+                carpetas_creadas.add(carpeta_destino)
+            response, contenido = _descargar_con_plazos(session, url, opciones['plazos'], coberturas)
+            encabezado, quedan = _avance(time.time() - _t0)
+            # Mostrar como tabla con progreso y tamaños legibles
+            tam_str = human_size(len(contenido))
+            ok = response.status_code == 200 and bool(contenido)
+            ruta_archivo = _reservar(ruta_base, "pdf") if ok else _guardar_txt(item, ruta_base, response.status_code)
+            tabla = "\n" + encabezado
+            tabla += "="*60 + "\n"
+            tabla += f"| {'Campo':<20} | {'Valor':<35} |\n"
+            tabla += f"|{'-'*20}|{'-'*35}|\n"
+            tabla += f"| {'Archivo':<20} | {ruta_archivo:<35} |\n"
+            tabla += f"| {'Enlace':<20} | {url:<35} |\n"
+            tabla += f"| {'Status HTTP':<20} | {response.status_code:<35} |\n"
+            tabla += f"| {'Tamaño recibido':<20} | {tam_str:<35} |\n"
+            tabla += f"| {'Tipo de contenido':<20} | {response.headers.get('Content-Type', 'N/A'):<35} |\n"
+            tabla += f"| {'Quedan':<20} | {quedan:<35} |\n"
+            tabla += f"| {'Cola escritura':<20} | {escritor.pendientes():<35} |\n"
+            if ok:
+                tamanos[url] = len(contenido)
+                escritor.escribir(ruta_archivo, contenido, _al_guardar_pdf(item, response.status_code), suma=True)
+                tabla += f"| {'Resultado':<20} | {'PDF descargado correctamente.':<35} |\n"
+            else:
+                tabla += f"| {'Resultado':<20} | {'No se pudo descargar el PDF. Se creó el TXT con el enlace.':<35} |\n"
+            tabla += "="*60 + "\n"
+            print(tabla)
+        except Exception as e:
+            # Intentar guardar TXT con el enlace
+            txt_creado = False
+            if encabezado is None:
+                encabezado, quedan = _avance(time.time() - _t0)
+            ruta_txt = None
+            # Sin carpeta destino el TXT tampoco puede escribirse
+            if os.path.isdir(carpeta_destino):
+                try:
+                    ruta_txt = _guardar_txt(item, ruta_base)
+                    txt_creado = True
+                except Exception:
+                    pass
+            # Formatear error en el mismo cuadro
+            tabla = "\n" + encabezado
+            tabla += "="*60 + "\n"
+            tabla += f"| {'Campo':<20} | {'Valor':<35} |\n"
+            tabla += f"|{'-'*20}|{'-'*35}|\n"
+            tabla += f"| {'Archivo TXT':<20} | {ruta_txt if txt_creado else 'No creado':<35} |\n"
+            tabla += f"| {'Enlace':<20} | {url or 'N/A':<35} |\n"
+            tabla += f"| {'Tamaño recibido':<20} | {'0 KB':<35} |\n"
+            tabla += f"| {'Quedan':<20} | {quedan:<35} |\n"
+            tabla += f"| {'Resultado':<20} | {'ERROR en la descarga':<35} |\n"
+            tabla += f"| {'Detalle error':<20} | {str(e):<35} |\n"
+            tabla += "="*60 + "\n"
+            print(tabla)
+            _sumar(errores=1)
+
+    def _guardar_txt(item, ruta_base, http_status=None):
+        # En un reintento el TXT ya existe: se conserva tal cual
+        if item.get('reemplaza'):
+            _sumar(total_txts=1)
+            return item['reemplaza']
+        ruta_txt = _reservar(ruta_base, "txt")
+        escritor.escribir(ruta_txt, item['url'].encode('utf-8'), _al_guardar_txt(item, http_status))
+        return ruta_txt
+
+    def _al_guardar_pdf(item, http_status):
+        # Devuelve el aviso que el hilo escritor llama cuando el PDF quedó (o no) en disco
+        def _aviso(ruta, datos, error):
+            if error is None:
+                _sumar(total_pdfs=1, total_bytes_descargados=len(datos))
+                if item.get('reemplaza'):
+                    # Reintento exitoso: el PDF reemplaza al TXT
                     try:
-                        _times_window.append(_elapsed)
-                    except Exception:
-                        pass
-                    _avg = (sum(_times_window) / len(_times_window)) if len(_times_window) else 0
-                    _eta_secs = int(round(quedan * _avg)) if _avg > 0 else 0
-                    _bar = _progress_bar(descarga_idx, total_intentos, 30)
+                        os.remove(item['reemplaza'])
+                    except OSError as e:
+                        print(f"No se pudo eliminar {item['reemplaza']}: {e}")
+                    if indice is not None:
+                        indice.reemplazar(item, item['reemplaza'], ruta, len(datos), http_status)
+                elif indice is not None:
+                    indice.registrar(item, ruta, 'pdf', len(datos), http_status)
+            else:
+                print(f"ERROR al escribir {ruta}: {error}")
+                _sumar(errores=1)
+        return _aviso
+
+    def _al_guardar_txt(item, http_status):
+        def _aviso(ruta, datos, error):
+            if error is None:
+                _sumar(total_txts=1)
+                # Registrar el TXT en el índice de pendientes para 'reintentar'
+                with lock:
                     try:
-                        with open(ruta_txt, "w", encoding="utf-8") as f:
-                            f.write(url or '')
-                        txt_creado = True
-                    except Exception:
+                        with open(indice_pendientes, 'a', encoding='utf-8') as f:
+                            f.write(os.path.relpath(ruta, carpeta_descargas) + "\n")
+                    except OSError:
                         pass
-                    # Formatear error en el mismo cuadro
-                    encabezado = f" {descarga_idx} / {total_intentos} - {percent_done}% {_bar} Tiempo restante: {_format_seconds(_eta_secs)}\n"
-                    tabla = "\n" + encabezado
-                    tabla += "="*60 + "\n"
-                    tabla += f"| {'Campo':<20} | {'Valor':<35} |\n"
-                    tabla += f"|{'-'*20}|{'-'*35}|\n"
-                    tabla += f"| {'Archivo TXT':<20} | {ruta_txt if txt_creado else 'No creado':<35} |\n"
-                    tabla += f"| {'Enlace':<20} | {url or 'N/A':<35} |\n"
-                    tabla += f"| {'Tamaño recibido':<20} | {'0 KB':<35} |\n"
-                    tabla += f"| {'Quedan':<20} | {quedan:<35} |\n"
-                    tabla += f"| {'Resultado':<20} | {'ERROR en la descarga':<35} |\n"
-                    tabla += f"| {'Detalle error':<20} | {str(e):<35} |\n"
-                    tabla += "="*60 + "\n"
-                    print(tabla)
-                    total_txts += 1
-                    errores += 1
+                if indice is not None:
+                    indice.registrar(item, ruta, 'txt', None, http_status)
             else:
-                print(f"No se pudo obtener una URL para descargar en la fila: {html}")
-                errores += 1
+                print(f"ERROR al escribir {ruta}: {error}")
+                _sumar(errores=1)
+        return _aviso
+
+    def _trabajador():
+        while True:
+            tomado = cola.tomar()
+            if tomado is None:
+                return
+            item, es_grande = tomado
+            try:
+                _descargar(item)
+            except Exception as e:
+                # Un elemento fallido no debe terminar el hilo
+                print(f"ERROR inesperado con {item.get('url', 'N/A')}: {e}")
+                _sumar(errores=1)
+            finally:
+                cola.terminar(es_grande)
+
+    hilos = [threading.Thread(target=_trabajador, daemon=True) for _ in range(opciones['simultaneas'])]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    # Esperar a los intentos originales aún en curso (acotado por sus plazos)
+    # para que el p99 sin respaldo los incluya
+    coberturas.esperar_perdedores(opciones['plazos']['conexion'] + opciones['plazos']['primer_byte'])
+    # Esperar a que la etapa de escritura vacíe su cola
+    escritor.cerrar()
+    if indice is not None:
+        indice.cerrar()
+
+    _guardar_tamanos(opciones['archivo_tamanos'], tamanos)
+
+    return {
+        'total_intentos': total_intentos,
+        'descarga_idx': cont['descarga_idx'],
+        'times_window': _times_window,
+        'total_archivos': plan['filas'],
+        'total_pdfs': cont['total_pdfs'],
+        'total_txts': cont['total_txts'],
+        'errores': cont['errores'],
+        'total_bytes_descargados': cont['total_bytes_descargados'],
+        'cola_escritura_max': escritor.max_pendientes,
+        'coberturas': coberturas.resumen(),
+        'latencia_p95': coberturas.percentil(95),
+    }
+
+def _procesar_lote(csv_files, config, session):
+    """Planifica y descarga una lista de CSV usando la sesión HTTP dada.
+
+    Devuelve un diccionario con los contadores para el resumen final.
+    """
+    return ejecutar_plan(planificar(csv_files, config), session, config=config)
+
+# --- Verificación de enlaces ---
+# Columnas del reporte de verificación, en orden
+COLUMNAS_REPORTE_ENLACES = ['csv', 'fila', 'url', 'clasificacion', 'estado', 'url_final',
+                            'content_type', 'content_length', 'detalle']
+
+def _consultar_enlace(session, url, plazos):
+    """Consulta un enlace sin descargarlo.
+
+    Usa HEAD y, si el servidor lo rechaza (error distinto de 404/410), un GET
+    del primer byte (`Range: bytes=0-0`). Devuelve un diccionario con
+    clasificacion ('vivo', 'redirigido', 'muerto' o 'error'), estado HTTP,
+    URL final, Content-Type, Content-Length (total del recurso) y detalle.
+    """
+    timeout = (plazos['conexion'], plazos['primer_byte'])
+    try:
+        r = session.head(url, allow_redirects=True, timeout=timeout)
+        if r.status_code >= 400 and r.status_code not in (404, 410):
+            r = session.get(url, allow_redirects=True, timeout=timeout, stream=True,
+                            headers={'Range': 'bytes=0-0'})
+            r.close()
+    except Exception as e:
+        return {'clasificacion': 'error', 'estado': '', 'url_final': '', 'content_type': '',
+                'content_length': '', 'detalle': str(e)}
+    # Con Range, el tamaño total viene en Content-Range ("bytes 0-0/12345")
+    rango = r.headers.get('Content-Range', '')
+    largo = rango.rsplit('/', 1)[-1] if r.status_code == 206 else r.headers.get('Content-Length', '')
+    if r.status_code >= 400:
+        clasificacion = 'muerto'
+    elif r.history:
+        clasificacion = 'redirigido'
+    else:
+        clasificacion = 'vivo'
+    return {
+        'clasificacion': clasificacion,
+        'estado': r.status_code,
+        'url_final': r.url,
+        'content_type': r.headers.get('Content-Type', ''),
+        'content_length': int(largo) if str(largo).isdigit() else '',
+        'detalle': '',
+    }
+
+def verificar_enlaces(plan, session, config):
+    """Verifica en paralelo los enlaces de un plan sin descargar los archivos.
 
-    # Mostrar resumen final
+    Cada URL distinta se consulta una vez, con hasta `verificaciones_simultaneas`
+    consultas en curso y no más de `max_verificaciones_por_servidor` por
+    servidor. Los Content-Length obtenidos se agregan a `archivo_tamanos`
+    para que la siguiente descarga ordene su cola por tamaño.
+    Devuelve una lista de filas (una por elemento del plan) para el reporte.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    opciones = _leer_opciones_descarga(config)
+    simultaneas = _opcion_numero(config, 'verificaciones_simultaneas', 32, 1)
+    por_servidor = _opcion_numero(config, 'max_verificaciones_por_servidor', 4, 1)
+    urls = list(dict.fromkeys(item['url'] for item in plan['items']))
+    print(f"Verificando {len(urls)} enlace(s) distintos de {len(plan['items'])} fila(s)...")
+
+    # Una cola por servidor: solo se envían al pool consultas de servidores con
+    # cupo libre, así ningún hilo queda esperando a un servidor ocupado
+    # mientras hay enlaces de otros servidores (los CSV vienen agrupados).
+    colas = {}
+    for url in urls:
+        colas.setdefault(urlparse(url).netloc, deque()).append(url)
+    en_curso = {}
+    pendientes = {}
+
+    def _despachar(ex):
+        # Reparto por turnos: una URL por servidor con cupo en cada pasada
+        avanzado = True
+        while avanzado and len(pendientes) < simultaneas:
+            avanzado = False
+            for host in list(colas):
+                if len(pendientes) >= simultaneas:
+                    break
+                if en_curso.get(host, 0) >= por_servidor:
+                    continue
+                url = colas[host].popleft()
+                if not colas[host]:
+                    del colas[host]
+                en_curso[host] = en_curso.get(host, 0) + 1
+                pendientes[ex.submit(_consultar_enlace, session, url, opciones['plazos'])] = (url, host)
+                avanzado = True
+
+    inicio = time.time()
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=simultaneas) as ex:
+        _despachar(ex)
+        while pendientes:
+            listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                url, host = pendientes.pop(futuro)
+                en_curso[host] -= 1
+                resultados[url] = futuro.result()
+                n = len(resultados)
+                if n % 500 == 0 or n == len(urls):
+                    print(f" {n} / {len(urls)} {_progress_bar(n, len(urls), 30)} {_format_seconds(time.time() - inicio)}")
+            _despachar(ex)
+
+    # Alimentar el registro de tamaños para las próximas descargas
+    tamanos = _cargar_tamanos(opciones['archivo_tamanos'])
+    for url, info in resultados.items():
+        if info['clasificacion'] in ('vivo', 'redirigido') and info['content_length'] != '':
+            tamanos[url] = info['content_length']
+    _guardar_tamanos(opciones['archivo_tamanos'], tamanos)
+
+    filas = []
+    for item in plan['items']:
+        fila = {'csv': item['csv'], 'fila': item['fila'], 'url': item['url']}
+        fila.update(resultados[item['url']])
+        filas.append(fila)
+    return filas
+
+def guardar_reporte_enlaces(filas, ruta):
+    """Guarda el reporte como JSON (si la ruta termina en .json) o CSV ';'."""
+    import csv
+    import json
+    if ruta.lower().endswith('.json'):
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(filas, f, ensure_ascii=False, indent=1)
+        return
+    # utf-8-sig para que Excel reconozca la codificación
+    with open(ruta, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNAS_REPORTE_ENLACES, delimiter=';')
+        writer.writeheader()
+        writer.writerows(filas)
+
+# --- Reintento de pendientes ---
+def _leer_placeholder(ruta):
+    """Devuelve la URL de un TXT de enlace pendiente, o None si no lo es.
+
+    Un TXT pendiente tiene una sola línea que empieza con http(s)://; la URL
+    puede contener espacios (se guardó tal cual venía en el href).
+    """
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            texto = f.read(4096).strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if texto.startswith(('http://', 'https://')) and '\n' not in texto and '\r' not in texto:
+        return texto
+    return None
+
+def _listar_pendientes(carpeta_descargas, recorrer=False):
+    """Rutas de los TXT pendientes bajo `carpeta_descargas`.
+
+    Usa el índice `INDICE_PENDIENTES` si existe (sin recorrer el árbol);
+    con `recorrer=True` o sin índice, recorre la carpeta completa.
+    """
+    indice = os.path.join(carpeta_descargas, INDICE_PENDIENTES)
+    if not recorrer and os.path.exists(indice):
+        with open(indice, 'r', encoding='utf-8') as f:
+            relativas = dict.fromkeys(line.rstrip('\r\n') for line in f if line.strip())
+        return [os.path.join(carpeta_descargas, r) for r in relativas]
+    rutas = []
+    for raiz, _dirs, archivos in os.walk(carpeta_descargas):
+        for nombre in archivos:
+            if nombre.lower().endswith('.txt') and nombre != INDICE_PENDIENTES:
+                rutas.append(os.path.join(raiz, nombre))
+    return rutas
+
+def reintentar_pendientes(session, config, recorrer=False):
+    """Reintenta solo las descargas que quedaron como TXT.
+
+    Cada TXT válido se convierte en un elemento de plan con `reemplaza`:
+    si la descarga resulta, el PDF se guarda junto al TXT con el mismo nombre
+    y el TXT se elimina; si no, el TXT queda como estaba. Al final el índice
+    de pendientes se reescribe solo con los TXT que siguen existiendo.
+    """
+    carpeta_descargas = config.get("carpeta_descargas", "descargas")
+    items = []
+    omitidos = 0
+    for ruta in _listar_pendientes(carpeta_descargas, recorrer):
+        url = _leer_placeholder(ruta)
+        if not url:
+            omitidos += 1
+            continue
+        relativa = os.path.relpath(os.path.dirname(ruta), carpeta_descargas)
+        items.append({
+            'url': url,
+            'dir': '' if relativa == '.' else relativa.replace(os.sep, '/'),
+            'stem': os.path.splitext(os.path.basename(ruta))[0],
+            'csv': '',
+            'fila': '',
+            'reemplaza': ruta,
+        })
+    print(f"TXT pendientes a reintentar: {len(items)}")
+    if omitidos:
+        print(f"TXT omitidos (no contienen un enlace válido): {omitidos}")
+    plan = {'carpeta_descargas': carpeta_descargas, 'filas': len(items), 'errores': 0, 'items': items}
+    resumen = ejecutar_plan(plan, session, config=config)
+
+    # Compactar el índice: solo los TXT que siguen pendientes
+    indice = os.path.join(carpeta_descargas, INDICE_PENDIENTES)
+    restantes = [r for r in _listar_pendientes(carpeta_descargas) if os.path.exists(r)] if os.path.exists(indice) else []
+    restantes += [i['reemplaza'] for i in items if os.path.exists(i['reemplaza'])]
+    tmp = f"{indice}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for ruta in dict.fromkeys(restantes):
+            f.write(os.path.relpath(ruta, carpeta_descargas) + "\n")
+    os.replace(tmp, indice)
+    return resumen
+
+def _imprimir_resumen(resumen):
+    """Imprime el resumen final a partir de los contadores de `_procesar_lote`."""
+    total_intentos = resumen['total_intentos']
+    descarga_idx = resumen['descarga_idx']
+    _times_window = resumen['times_window']
     print("\n" + "#"*60)
     print("RESUMEN DE DESCARGA")
     # Métricas de avance
@@ -893,28 +2003,278 @@ def procesar_csvs():
     print(f"Descargas intentadas: {descarga_idx}")
     print(f"Completado: {percent_complete}%")
     print(f"Progreso final: {descarga_idx} / {total_intentos} - {percent_complete}% {_bar_final} Tiempo restante: {_format_seconds(_eta_final)}")
-    print(f"Total descargado: {human_size_summary(total_bytes_descargados)}")
-    print(f"Total de archivos procesados: {total_archivos}")
-    print(f"PDFs descargados correctamente: {total_pdfs}")
-    print(f"Archivos TXT generados: {total_txts}")
-    print(f"Errores encontrados: {errores}")
+    print(f"Total descargado: {human_size_summary(resumen['total_bytes_descargados'])}")
+    print(f"Total de archivos procesados: {resumen['total_archivos']}")
+    print(f"PDFs descargados correctamente: {resumen['total_pdfs']}")
+    print(f"Archivos TXT generados: {resumen['total_txts']}")
+    print(f"Errores encontrados: {resumen['errores']}")
+    if 'latencia_p95' in resumen:
+        print(f"Latencia p95 por descarga: {resumen['latencia_p95']:.2f} s")
+    if 'cola_escritura_max' in resumen:
+        print(f"Máximo en cola de escritura: {resumen['cola_escritura_max']}")
+    coberturas = resumen.get('coberturas')
+    if coberturas and coberturas['activo']:
+        print(f"Peticiones de respaldo lanzadas: {coberturas['disparos']} (ganaron: {coberturas['ganadas']})")
+        print(f"Latencia p99: {coberturas['p99_con']:.2f} s con respaldo / "
+              f"{coberturas['p99_sin']:.2f} s sin respaldo (estimado)")
     print("#"*60 + "\n")
 
+# Si se ejecuta con argumento 'run', no mostrar la interfaz, solo ejecutar el script real
+def procesar_csvs():
+    r"""Procesa los CSV y descarga los archivos enlazados.
+
+     Flujo principal:
+     1) Lee `config.txt` para saber dónde están los CSV y cómo construir la
+         estructura de carpetas destino (prefijo/sufijo y/o carpeta combinada).
+     2) Abre cada CSV (separador ';', encoding latin-1) y por cada fila extrae
+         un enlace (URL directa o HTML con un href).
+     3) Descarga el recurso. Si es exitoso (HTTP 200 con contenido), guarda PDF;
+         en caso contrario, genera un TXT con el enlace.
+
+     Robustez añadida:
+     - Se sanea el "stem" del nombre de archivo derivado de la URL para evitar
+        caracteres inválidos en Windows (p.ej. ?, *, :, \, /, ", <, >, |, &).
+     - Se descarta la parte de consulta (query) de la URL para el nombre visible,
+        añadiendo un hash corto del query cuando exista, para diferenciar recursos.
+     - Se manejan nombres reservados (CON, PRN, AUX, NUL, COM1.., LPT1..).
+    - Se garantiza que los separadores vacíos equivalen a un espacio.
+    """
+    import glob
+
+    # Leer configuración desde config.txt (crea defaults si no existe)
+    config = leer_config()
+    csv_folder = config.get("csv_folder", "csvs")
+    eliminar_csv_al_final = config.get("eliminar_csv_al_final", "false").lower() == "true"
+
+    _iniciar_registro(config)
+
+    # Obtener lista de archivos CSV desde la carpeta configurada
+    csv_files = glob.glob(os.path.join(csv_folder, "*.csv"))
+
+    session = _crear_sesion(max(10, _leer_opciones_descarga(config)['simultaneas']))
+    resumen = _procesar_lote(csv_files, config, session)
+    _imprimir_resumen(resumen)
+
     input("Presiona ENTER para cerrar la ventana...")
 
     # Eliminar los archivos CSV si la opción está activada
     if eliminar_csv_al_final:
-        for csv_file in csv_files:
+        _eliminar_csvs(csv_files)
+
+def _firmas_csv(carpeta):
+    """Devuelve {ruta: (mtime_ns, tamaño)} de los CSV presentes en `carpeta`."""
+    firmas = {}
+    try:
+        with os.scandir(carpeta) as it:
+            for entry in it:
+                if not entry.name.lower().endswith('.csv'):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                firmas[os.path.join(carpeta, entry.name)] = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        pass
+    return firmas
+
+def vigilar_csvs():
+    """Modo servicio: vigila `csv_folder` y procesa cada CSV nuevo o modificado.
+
+    - Sondea la carpeta cada `intervalo_vigilancia` segundos con `os.scandir`
+      (funciona igual en Windows y Linux, sin dependencias adicionales).
+    - Un CSV se encola cuando su tamaño y fecha de modificación no cambian
+      entre dos sondeos consecutivos, para no leer archivos a medio copiar.
+    - Un único hilo descargador consume la cola reutilizando la misma sesión
+      HTTP, por lo que las conexiones se mantienen abiertas entre archivos.
+    - Si `eliminar_csv_al_final` está activo, cada CSV se elimina apenas
+      termina su propio procesamiento.
+
+    Se detiene con Ctrl+C.
+    """
+    import queue
+
+    config = leer_config()
+    csv_folder = config.get("csv_folder", "csvs")
+    intervalo = _opcion_numero(config, 'intervalo_vigilancia', 2.0, 0.2, float)
+
+    _iniciar_registro(config)
+    os.makedirs(csv_folder, exist_ok=True)
+
+    session = _crear_sesion(max(10, _leer_opciones_descarga(config)['simultaneas']))
+    cola = queue.Queue()
+    lock = threading.Lock()
+    procesados = {}    # ruta -> firma con la que ya se procesó
+    pendientes = set()  # rutas encoladas o en proceso
+
+    def _trabajador():
+        while True:
+            ruta, firma = cola.get()
             try:
-                os.remove(csv_file)
-                print(f"Eliminado CSV: {csv_file}")
+                # Releer config para aplicar cambios sin reiniciar el servicio
+                config_actual = leer_config()
+                resumen = _procesar_lote([ruta], config_actual, session)
+                _imprimir_resumen(resumen)
+                if config_actual.get("eliminar_csv_al_final", "false").lower() == "true":
+                    _eliminar_csvs([ruta])
             except Exception as e:
-                print(f"Error al eliminar {csv_file}: {e}")
+                print(f"Error al procesar {ruta}: {e}")
+            finally:
+                with lock:
+                    procesados[ruta] = firma
+                    pendientes.discard(ruta)
+                cola.task_done()
+                print(f"Vigilando '{csv_folder}'... (CSV en cola: {cola.qsize()})")
+
+    threading.Thread(target=_trabajador, daemon=True).start()
+    print(f"Vigilando '{os.path.abspath(csv_folder)}' cada {intervalo:g} s. Presiona Ctrl+C para detener.")
+
+    vistos = {}
+    try:
+        while True:
+            actuales = _firmas_csv(csv_folder)
+            with lock:
+                for ruta, firma in actuales.items():
+                    # Solo encolar si el archivo está estable y no se procesó con esta firma
+                    if vistos.get(ruta) != firma or procesados.get(ruta) == firma or ruta in pendientes:
+                        continue
+                    pendientes.add(ruta)
+                    cola.put((ruta, firma))
+                    print(f"Nuevo CSV en cola: {ruta}")
+                # Olvidar archivos eliminados para procesarlos si vuelven a aparecer
+                for ruta in [r for r in procesados if r not in actuales]:
+                    del procesados[ruta]
+            vistos = actuales
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        print("Vigilancia detenida por el usuario.")
+
+def crear_plan(ruta_plan='plan_descargas.jsonl'):
+    """Comando 'planificar': genera el plan de descargas sin acceder a la red."""
+    import glob
+    config = leer_config()
+    csv_files = glob.glob(os.path.join(config.get("csv_folder", "csvs"), "*.csv"))
+    plan = planificar(csv_files, config)
+    guardar_plan(plan, ruta_plan)
+    print(f"Plan guardado en {os.path.abspath(ruta_plan)}: {len(plan['items'])} descargas "
+          f"de {plan['filas']} filas ({plan['errores']} errores).")
+
+def ejecutar_plan_guardado(ruta_plan, carpeta_descargas=None):
+    """Comando 'ejecutar': descarga un plan generado con 'planificar'.
+
+    Opcionalmente recibe otra carpeta destino para reubicar el árbol.
+    """
+    config = leer_config()
+    _iniciar_registro(config)
+    plan = cargar_plan(ruta_plan)
+    session = _crear_sesion(max(10, _leer_opciones_descarga(config)['simultaneas']))
+    resumen = ejecutar_plan(plan, session, carpeta_descargas, config)
+    _imprimir_resumen(resumen)
+
+def verificar_enlaces_csv(ruta_reporte='reporte_enlaces.csv', ruta_plan=None):
+    """Comando 'verificar': revisa los enlaces (de un plan o de los CSV) y
+    escribe el reporte con estado, URL final, tipo y tamaño de cada fila."""
+    import glob
+    config = leer_config()
+    if ruta_plan:
+        plan = cargar_plan(ruta_plan)
+    else:
+        csv_files = glob.glob(os.path.join(config.get("csv_folder", "csvs"), "*.csv"))
+        plan = planificar(csv_files, config)
+    session = _crear_sesion(max(10, _opcion_numero(config, 'verificaciones_simultaneas', 32, 1)))
+    inicio = time.time()
+    filas = verificar_enlaces(plan, session, config)
+    guardar_reporte_enlaces(filas, ruta_reporte)
+    conteo = {}
+    total_bytes = 0
+    for fila in filas:
+        conteo[fila['clasificacion']] = conteo.get(fila['clasificacion'], 0) + 1
+        if isinstance(fila['content_length'], int):
+            total_bytes += fila['content_length']
+    print("\n" + "#"*60)
+    print("RESUMEN DE VERIFICACIÓN")
+    for clasificacion in ('vivo', 'redirigido', 'muerto', 'error'):
+        print(f"{clasificacion.capitalize():<12}: {conteo.get(clasificacion, 0)}")
+    print(f"Tamaño estimado a descargar: {human_size_summary(total_bytes)}")
+    print(f"Tiempo: {_format_seconds(time.time() - inicio)}")
+    print(f"Reporte: {os.path.abspath(ruta_reporte)}")
+    print("#"*60 + "\n")
+
+def reintentar_csv(modo=''):
+    """Comando 'reintentar': vuelve a intentar los TXT pendientes.
+
+    Con `recorrer` ignora el índice y recorre toda la carpeta de descargas.
+    """
+    config = leer_config()
+    _iniciar_registro(config)
+    session = _crear_sesion(max(10, _leer_opciones_descarga(config)['simultaneas']))
+    resumen = reintentar_pendientes(session, config, recorrer=(modo == 'recorrer'))
+    _imprimir_resumen(resumen)
+
+def verificar_integridad_csv(ruta_reporte=None):
+    """Comando 'integridad': verifica el árbol de descargas contra sus registros
+    de sumas y, opcionalmente, guarda los problemas en un CSV ';'."""
+    import csv
+    config = leer_config()
+    carpeta_descargas = config.get("carpeta_descargas", "descargas")
+    print(f"Verificando integridad de '{os.path.abspath(carpeta_descargas)}'...")
+    conteo, problemas = verificar_integridad(carpeta_descargas)
+    for ruta, estado in problemas:
+        print(f"{estado.upper():<16} {ruta}")
+    print("\n" + "#"*60)
+    print("RESUMEN DE INTEGRIDAD")
+    for estado in ('ok', 'faltante', 'truncado', 'tamano_distinto', 'corrupto', 'ilegible', 'sin_registro'):
+        print(f"{estado:<16}: {conteo.get(estado, 0)}")
+    print("#"*60 + "\n")
+    if ruta_reporte:
+        with open(ruta_reporte, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(['ruta', 'estado'])
+            writer.writerows(problemas)
+        print(f"Reporte: {os.path.abspath(ruta_reporte)}")
+
+def buscar_csv(texto, limite='50'):
+    """Comando 'buscar': muestra los archivos del índice cuyo CSV, URL, ruta
+    o valor de columna de carpeta coincide exactamente con `texto`."""
+    config = leer_config()
+    ruta_indice = config.get('archivo_indice', 'indice_descargas.sqlite').strip()
+    if not ruta_indice or not os.path.exists(ruta_indice):
+        print(f"No existe el índice '{ruta_indice}'. Se crea al descargar con 'archivo_indice' configurado.")
+        return
+    filas = buscar_en_indice(ruta_indice, texto, int(limite))
+    for csv_file, fila, prefijo, col1, col2, estado, tamano, ruta, url in filas:
+        print(f"[{estado}] {ruta} ({human_size(tamano) if tamano else '-'})")
+        print(f"    {csv_file} fila {fila} | {prefijo} | {col1} | {col2}")
+        print(f"    {url}")
+    print(f"{len(filas)} resultado(s).")
 
 import sys
 if __name__ == '__main__':
     if len(sys.argv) > 1 and sys.argv[1] == 'run':
         print('Ejecutando el script principal...')
         procesar_csvs()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'vigilar':
+        print('Iniciando modo vigilancia...')
+        vigilar_csvs()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'planificar':
+        # Uso: python script.py planificar [plan.jsonl]
+        crear_plan(*sys.argv[2:3])
+    elif len(sys.argv) > 2 and sys.argv[1] == 'ejecutar':
+        # Uso: python script.py ejecutar plan.jsonl [carpeta_descargas]
+        ejecutar_plan_guardado(*sys.argv[2:4])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'reintentar':
+        # Uso: python script.py reintentar [recorrer]
+        reintentar_csv(*sys.argv[2:3])
+    elif len(sys.argv) > 2 and sys.argv[1] == 'buscar':
+        # Uso: python script.py buscar <texto> [limite]
+        buscar_csv(*sys.argv[2:4])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'integridad':
+        # Uso: python script.py integridad [reporte.csv]
+        verificar_integridad_csv(*sys.argv[2:3])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'verificar':
+        # Uso: python script.py verificar [reporte.csv|reporte.json] [plan.jsonl]
+        verificar_enlaces_csv(*sys.argv[2:4])
     else:
         mostrar_interfaz()